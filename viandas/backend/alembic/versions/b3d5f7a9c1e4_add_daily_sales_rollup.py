@@ -0,0 +1,36 @@
+"""add daily_sales_rollup table
+
+Revision ID: b3d5f7a9c1e4
+Revises: a7c9e1f3b5d8
+Create Date: 2026-10-18 16:05:31.447920
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3d5f7a9c1e4'
+down_revision: Union[str, None] = 'a7c9e1f3b5d8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # El histórico se carga con: python -m scripts.rebuild_sales_rollup
+    op.create_table('daily_sales_rollup',
+        sa.Column('date', sa.Date(), nullable=False),
+        sa.Column('product_id', sa.Integer(), nullable=False),
+        sa.Column('medioPago', sa.String(), server_default='', nullable=False),
+        sa.Column('units', sa.Integer(), nullable=False),
+        sa.Column('revenue', sa.Float(), nullable=False),
+        sa.Column('sales_count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+        sa.PrimaryKeyConstraint('date', 'product_id', 'medioPago')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('daily_sales_rollup')
@@ -0,0 +1,31 @@
+"""add partial index for products at or below their minimum stock
+
+Revision ID: c4e6a8b0d2f5
+Revises: b3d5f7a9c1e4
+Create Date: 2026-10-18 16:48:02.315776
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e6a8b0d2f5'
+down_revision: Union[str, None] = 'b3d5f7a9c1e4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index('ix_products_low_stock', 'products', ['id'], unique=False,
+                        postgresql_where=sa.text('is_active AND stock <= "stockMinimo"'),
+                        postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_products_low_stock', table_name='products',
+                      postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,48 @@
+"""add indexes for sales queues and lineOfSale foreign keys
+
+Revision ID: c7d9e2f4a813
+Revises: 8f3b2d6e1a57
+Create Date: 2026-10-18 12:40:09.331870
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7d9e2f4a813'
+down_revision: Union[str, None] = '8f3b2d6e1a57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (nombre, tabla, columnas) - deben coincidir con models.py
+INDEXES = [
+    # selectinload(Sale.line_of_sales) y búsquedas de líneas por producto
+    ('ix_lineOfSale_sale_id', 'lineOfSale', ['sale_id']),
+    ('ix_lineOfSale_product_id', 'lineOfSale', ['product_id']),
+    # /sales/ventas: sale_in_register = true + fecha, ORDER BY date DESC, id DESC
+    ('ix_sales_in_register_date_id', 'sales', ['sale_in_register', 'date', 'id']),
+    # /sales/pedidos-solicitados y /sales/pendientes-retiro
+    ('ix_sales_confirmed_in_register_date_id', 'sales', ['order_confirmed', 'sale_in_register', 'date', 'id']),
+    # /sales/my-orders/ready-for-pickup (también cubre la FK user_id)
+    ('ix_sales_user_confirmed_in_register', 'sales', ['user_id', 'order_confirmed', 'sale_in_register', 'date', 'id']),
+    # Rangos de fecha sin filtro de estado (export, /sales/all?from=&to=)
+    ('ix_sales_date_id', 'sales', ['date', 'id']),
+]
+
+
+def upgrade() -> None:
+    # CONCURRENTLY no bloquea escrituras mientras se construye el índice,
+    # pero no puede correr dentro de la transacción de la migración.
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False,
+                            postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, columns in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,50 @@
+"""add total column to sales with batched backfill from lineOfSale
+
+Revision ID: d5f7b9c1e3a6
+Revises: c4e6a8b0d2f5
+Create Date: 2026-10-18 17:21:40.651093
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5f7b9c1e3a6'
+down_revision: Union[str, None] = 'c4e6a8b0d2f5'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH_SIZE = 10000
+
+
+def backfill_statement(where: str):
+    return sa.text(f"""
+        UPDATE sales SET total = coalesce((
+            SELECT sum(l.cantidad * l.precio) FROM "lineOfSale" l WHERE l.sale_id = sales.id
+        ), 0)
+        WHERE {where} AND total IS NULL
+    """)
+
+
+def upgrade() -> None:
+    # Nullable y sin default: el ALTER no reescribe la tabla
+    op.add_column('sales', sa.Column('total', sa.Float(), nullable=True))
+
+    # Cada tanda suma lineOfSale de BACKFILL_BATCH_SIZE ventas y commitea sola, sin acumular locks hasta el final
+    conn = op.get_bind()
+    batch = backfill_statement("id >= :start AND id < :end")
+    with op.get_context().autocommit_block():
+        max_id = conn.execute(sa.text("SELECT coalesce(max(id), 0) FROM sales")).scalar()
+        for start in range(0, max_id + 1, BACKFILL_BATCH_SIZE):
+            conn.execute(batch, {"start": start, "end": start + BACKFILL_BATCH_SIZE})
+
+    # Ventas creadas mientras corría el backfill
+    conn.execute(backfill_statement("true"))
+    op.alter_column('sales', 'total', nullable=False, server_default='0')
+
+
+def downgrade() -> None:
+    op.drop_column('sales', 'total')
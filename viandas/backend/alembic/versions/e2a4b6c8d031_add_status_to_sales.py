@@ -0,0 +1,83 @@
+"""add status column to sales with partial indexes for live queues
+
+Revision ID: e2a4b6c8d031
+Revises: c7d9e2f4a813
+Create Date: 2026-10-18 13:55:42.610274
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2a4b6c8d031'
+down_revision: Union[str, None] = 'c7d9e2f4a813'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH_SIZE = 10000
+
+# Mismo criterio que core.sale_status.status_for (NULL cuenta como false)
+STATUS_CASE = """
+    CASE
+        WHEN coalesce(sale_in_register, false) AND coalesce(pagado, false) THEN 'finalizado'
+        WHEN coalesce(sale_in_register, false) THEN 'registrado'
+        WHEN coalesce(order_confirmed, false) THEN 'confirmado'
+        ELSE 'solicitado'
+    END
+"""
+
+PARTIAL_INDEXES = [
+    ('ix_sales_solicitados', ['date', 'id'], "status = 'solicitado'"),
+    ('ix_sales_confirmados', ['date', 'id'], "status = 'confirmado'"),
+    ('ix_sales_confirmados_user', ['user_id', 'date', 'id'], "status = 'confirmado'"),
+]
+
+
+def upgrade() -> None:
+    op.add_column('sales', sa.Column('status', sa.String(), nullable=True))
+
+    # Una transacción por tanda: confirmar o registrar un pedido sólo espera a la tanda de su fila
+    backfill = sa.text(f"UPDATE sales SET status = {STATUS_CASE} WHERE id >= :start AND id < :end AND status IS NULL")
+    conn = op.get_bind()
+    with op.get_context().autocommit_block():
+        max_id = conn.execute(sa.text("SELECT coalesce(max(id), 0) FROM sales")).scalar()
+        for start in range(0, max_id + 1, BACKFILL_BATCH_SIZE):
+            conn.execute(backfill, {"start": start, "end": start + BACKFILL_BATCH_SIZE})
+
+    # Pedidos creados mientras corría el backfill
+    conn.execute(sa.text(f"UPDATE sales SET status = {STATUS_CASE} WHERE status IS NULL"))
+    op.alter_column('sales', 'status', nullable=False, server_default='solicitado')
+    op.create_check_constraint(
+        'ck_sales_status', 'sales',
+        "status IN ('solicitado', 'confirmado', 'registrado', 'finalizado')",
+    )
+
+    with op.get_context().autocommit_block():
+        for name, columns, where in PARTIAL_INDEXES:
+            op.create_index(name, 'sales', columns, unique=False, postgresql_where=sa.text(where),
+                            postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_sales_user_id', 'sales', ['user_id'], unique=False,
+                        postgresql_concurrently=True, if_not_exists=True)
+        # Las colas ya no filtran por los booleanos: estos índices quedan sin uso
+        op.drop_index('ix_sales_confirmed_in_register_date_id', table_name='sales',
+                      postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_sales_user_confirmed_in_register', table_name='sales',
+                      postgresql_concurrently=True, if_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index('ix_sales_user_confirmed_in_register', 'sales',
+                        ['user_id', 'order_confirmed', 'sale_in_register', 'date', 'id'],
+                        unique=False, postgresql_concurrently=True, if_not_exists=True)
+        op.create_index('ix_sales_confirmed_in_register_date_id', 'sales',
+                        ['order_confirmed', 'sale_in_register', 'date', 'id'],
+                        unique=False, postgresql_concurrently=True, if_not_exists=True)
+        op.drop_index('ix_sales_user_id', table_name='sales', postgresql_concurrently=True, if_exists=True)
+        for name, columns, where in reversed(PARTIAL_INDEXES):
+            op.drop_index(name, table_name='sales', postgresql_concurrently=True, if_exists=True)
+    op.drop_constraint('ck_sales_status', 'sales', type_='check')
+    op.drop_column('sales', 'status')
@@ -0,0 +1,83 @@
+"""add created_at/updated_at and change_seq to sales and products for delta sync
+
+Revision ID: f1b3c5d7e9a2
+Revises: e2a4b6c8d031
+Create Date: 2026-10-18 14:32:10.118402
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1b3c5d7e9a2'
+down_revision: Union[str, None] = 'e2a4b6c8d031'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH_SIZE = 10000
+
+# tabla -> (secuencia, valor inicial de created_at para las filas existentes)
+TABLES = {
+    'sales': ('sales_change_seq', "coalesce(date::timestamptz, now())"),
+    'products': ('products_change_seq', "now()"),
+}
+
+
+def backfill_statement(table: str, seq: str, created_expr: str, where: str):
+    # El orden de change_seq sigue el orden de los ids
+    return sa.text(f"""
+        UPDATE {table} SET
+            created_at = {created_expr},
+            updated_at = {created_expr},
+            change_seq = nextval('{seq}')
+        FROM (
+            SELECT id FROM {table}
+            WHERE {where} AND change_seq IS NULL
+            ORDER BY id
+        ) AS pending
+        WHERE {table}.id = pending.id
+    """)
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    for table, (seq, _) in TABLES.items():
+        op.execute(sa.schema.CreateSequence(sa.Sequence(seq), if_not_exists=True))
+        op.add_column(table, sa.Column('created_at', sa.DateTime(timezone=True), nullable=True))
+        op.add_column(table, sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True))
+        op.add_column(table, sa.Column('change_seq', sa.BigInteger(), nullable=True))
+
+    # Una transacción por tanda, en orden de id, así change_seq también queda en ese orden
+    with op.get_context().autocommit_block():
+        for table, (seq, created_expr) in TABLES.items():
+            batch = backfill_statement(table, seq, created_expr, "id >= :start AND id < :end")
+            max_id = conn.execute(sa.text(f"SELECT coalesce(max(id), 0) FROM {table}")).scalar()
+            for start in range(0, max_id + 1, BACKFILL_BATCH_SIZE):
+                conn.execute(batch, {"start": start, "end": start + BACKFILL_BATCH_SIZE})
+
+    # Filas creadas mientras corría el backfill; reciben change_seq después de todas las viejas
+    for table, (seq, created_expr) in TABLES.items():
+        conn.execute(backfill_statement(table, seq, created_expr, "true"))
+        op.alter_column(table, 'created_at', nullable=False, server_default=sa.func.now())
+        op.alter_column(table, 'updated_at', nullable=False, server_default=sa.func.now())
+        op.alter_column(table, 'change_seq', nullable=False, server_default=sa.text(f"nextval('{seq}')"))
+
+    with op.get_context().autocommit_block():
+        for table in TABLES:
+            op.create_index(f'ix_{table}_change_seq', table, ['change_seq'], unique=True,
+                            postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for table in reversed(list(TABLES)):
+            op.drop_index(f'ix_{table}_change_seq', table_name=table,
+                          postgresql_concurrently=True, if_exists=True)
+    for table, (seq, _) in reversed(list(TABLES.items())):
+        op.drop_column(table, 'change_seq')
+        op.drop_column(table, 'updated_at')
+        op.drop_column(table, 'created_at')
+        op.execute(sa.schema.DropSequence(sa.Sequence(seq), if_exists=True))
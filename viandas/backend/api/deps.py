@@ -1,37 +1,75 @@
 from fastapi import Security, Depends, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials
 from jose import JWTError, jwt
-from sqlalchemy.orm import Session
-from config import SessionLocal
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from config import SessionLocal, AsyncSessionLocal
 from models.models import User
 from core.security import security, SECRET_KEY, ALGORITHM
+from core.identity import Identity, identity_cache
 
 def get_db():
+    # Sesión sync, para los routers que todavía no migraron a AsyncSession
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
 
-async def get_current_user(
-    db: Session = Depends(get_db),
-    token: HTTPAuthorizationCredentials = Security(security)
-) -> User:
-    token_str = token.credentials  # Obtenemos el JWT sin el prefijo
-    credentials_exception = HTTPException(
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def _token_subject(token: HTTPAuthorizationCredentials) -> str:
+    token_str = token.credentials  # Obtenemos el JWT sin el prefijo
     try:
         payload = jwt.decode(token_str, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
         if email is None:
-            raise credentials_exception
+            raise _credentials_exception()
     except JWTError:
-        raise credentials_exception
-    
-    user = db.query(User).filter(User.email == email).first()
+        raise _credentials_exception()
+    return email
+
+async def get_current_identity(
+    token: HTTPAuthorizationCredentials = Security(security)
+) -> Identity:
+    """
+    Identidad (id, email, rol, is_active) del usuario del token, desde el cache.
+    Sin consultas a la base salvo en un miss; no abre sesión si la identidad está cacheada.
+    """
+    email = _token_subject(token)
+    identity = identity_cache.get(email)
+    if identity is not None:
+        return identity
+
+    async with AsyncSessionLocal() as db:
+        row = (await db.execute(
+            select(User.id, User.email, User.role, User.is_active).where(User.email == email)
+        )).first()
+    if row is None:
+        raise _credentials_exception()
+    identity = Identity(id=row.id, email=row.email, role=row.role, is_active=row.is_active)
+    identity_cache.put(email, identity)
+    return identity
+
+async def get_current_user(
+    db: AsyncSession = Depends(get_async_db),
+    token: HTTPAuthorizationCredentials = Security(security)
+) -> User:
+    """User ORM completo, para las rutas que leen o modifican el usuario."""
+    email = _token_subject(token)
+    credentials_exception = _credentials_exception()
+
+    result = await db.execute(select(User).where(User.email == email))
+    user = result.scalars().first()
     if user is None:
         raise credentials_exception
-    return user
\ No newline at end of file
+    return user
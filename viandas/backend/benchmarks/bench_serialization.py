@@ -0,0 +1,105 @@
+# benchmarks/bench_serialization.py
+# Compara la serialización actual de FastAPI (validar cada venta contra SaleAdminView con
+# from_attributes + json de la stdlib) con la capa rápida de core/serialization.py.
+#
+# Uso (desde viandas/backend):
+#   USE_ASYNC_DB=false python -m benchmarks.bench_serialization --sales 10000
+#
+# No necesita base de datos: arma objetos ORM en memoria.
+
+import argparse
+import json
+import random
+import time
+from datetime import date, timedelta
+
+from models.models import Sale, LineOfSale, Product, User
+from core.serialization import SALE_LIST_ADAPTER, sales_to_rows, sales_to_compact, dumps
+
+
+def build_sales(n_sales: int, n_products: int = 15, n_users: int = 500, seed: int = 42):
+    rnd = random.Random(seed)
+    products = [
+        Product(
+            id=i, nombre=f"Vianda {i}", precioActual=round(rnd.uniform(2500, 9000), 2),
+            detalle="Detalle de la vianda " * 3, mostrarEnSistema=True, foto=f"/static/product_images/{i}.jpg",
+            stock=rnd.randint(0, 200), stockMinimo=5, is_active=True, reserved=rnd.randint(0, 10),
+        )
+        for i in range(1, n_products + 1)
+    ]
+    users = [
+        User(id=i, name=f"Cliente {i}", apellido="Pérez", email=f"cliente{i}@example.com",
+             celular="1155550000", is_active=True, role="user")
+        for i in range(1, n_users + 1)
+    ]
+    sales = []
+    line_id = 1
+    start = date(2025, 1, 1)
+    for sale_id in range(1, n_sales + 1):
+        user = rnd.choice(users)
+        lines = []
+        for number in range(1, rnd.randint(1, 5) + 1):
+            product = rnd.choice(products)
+            lines.append(LineOfSale(
+                id=line_id, cantidad=rnd.randint(1, 3), numeroDeLinea=number,
+                precio=product.precioActual, product_id=product.id, product=product, sale_id=sale_id,
+            ))
+            line_id += 1
+        sales.append(Sale(
+            id=sale_id, quantity_product=sum(l.cantidad for l in lines), observation=None,
+            total=sum(l.cantidad * l.precio for l in lines),
+            date=start + timedelta(days=sale_id % 365), order_confirmed=True, sale_in_register=True,
+            medioPago="Efectivo", pagado=True, status="finalizado", user_id=user.id, user=user, line_of_sales=lines,
+        ))
+    return sales
+
+
+def current_path(sales) -> bytes:
+    # Lo que hace FastAPI con response_model=List[SaleAdminView]
+    validated = SALE_LIST_ADAPTER.validate_python(sales, from_attributes=True)
+    content = SALE_LIST_ADAPTER.dump_python(validated, mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def fast_path(sales) -> bytes:
+    return dumps(sales_to_rows(sales))
+
+
+def compact_path(sales) -> bytes:
+    return dumps(sales_to_compact(sales, None))
+
+
+def measure(fn, sales, repeat: int):
+    timings = []
+    body = b""
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = fn(sales)
+        timings.append(time.perf_counter() - start)
+    return min(timings), sum(timings) / len(timings), len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sales", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    sales = build_sales(args.sales)
+    # Las dos rutas tienen que producir el mismo JSON
+    assert json.loads(current_path(sales[:200])) == json.loads(fast_path(sales[:200])), "los caminos difieren"
+
+    results = {
+        "actual (SaleAdminView + json)": measure(current_path, sales, args.repeat),
+        "rápido (dicts + orjson)": measure(fast_path, sales, args.repeat),
+        "rápido compacto": measure(compact_path, sales, args.repeat),
+    }
+    baseline = results["actual (SaleAdminView + json)"][0]
+    print(f"{args.sales} ventas, {args.repeat} repeticiones")
+    print(f"{'camino':32} {'min ms':>9} {'prom ms':>9} {'bytes':>11} {'speedup':>8}")
+    for name, (best, mean, size) in results.items():
+        print(f"{name:32} {best * 1000:9.1f} {mean * 1000:9.1f} {size:11d} {baseline / best:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
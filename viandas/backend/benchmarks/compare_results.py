@@ -0,0 +1,55 @@
+# benchmarks/compare_results.py
+# Compara dos JSON de benchmarks.load_test (por ejemplo, main contra una rama).
+#
+# Uso (desde viandas/backend):
+#   python -m benchmarks.compare_results results/base.json results/rama.json
+#
+# Muestra throughput y p50/p95/p99 de cada escenario y el cambio relativo. Con
+# --fail-above sale con código 1 si algún p95 empeora más que ese porcentaje (para CI).
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+METRICS = ("throughput_rps", "p50_ms", "p95_ms", "p99_ms")
+
+
+def change(before: float, after: float) -> float:
+    return (after - before) / before * 100 if before else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara dos resultados de benchmarks.load_test")
+    parser.add_argument("base", type=Path)
+    parser.add_argument("candidate", type=Path)
+    parser.add_argument("--fail-above", type=float, help="%% máximo de empeoramiento del p95")
+    args = parser.parse_args()
+
+    base = json.loads(args.base.read_text())
+    candidate = json.loads(args.candidate.read_text())
+    print(f"base:      {base['meta']['commit'][:10]}  ({base['meta']['timestamp']})")
+    print(f"candidato: {candidate['meta']['commit'][:10]}  ({candidate['meta']['timestamp']})")
+    print(f"{'escenario':22} " + " ".join(f"{metric:>24}" for metric in METRICS))
+
+    regressions = []
+    for name, after in candidate["scenarios"].items():
+        before = base["scenarios"].get(name)
+        if before is None:
+            print(f"{name:22} (sin base)")
+            continue
+        cells = [
+            f"{before[metric]:9.1f} → {after[metric]:7.1f} {change(before[metric], after[metric]):+5.0f}%"
+            for metric in METRICS
+        ]
+        print(f"{name:22} " + " ".join(f"{cell:>24}" for cell in cells))
+        if args.fail_above is not None and change(before["p95_ms"], after["p95_ms"]) > args.fail_above:
+            regressions.append(name)
+
+    if regressions:
+        print(f"p95 empeoró más de {args.fail_above}% en: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+# benchmarks/load_test.py
+# Carga HTTP contra una instancia corriendo de la API: throughput y latencia p50/p95/p99
+# de los endpoints calientes. Escribe un JSON comparable entre commits.
+#
+# Uso (desde viandas/backend, con la base cargada por benchmarks.seed_data):
+#   uvicorn main:app --workers 4 &
+#   python -m benchmarks.load_test --duration 30 --concurrency 32 --output results/abc123.json
+#   python -m benchmarks.compare_results results/base.json results/abc123.json
+#
+# Cada escenario corre por separado durante --duration segundos con --concurrency
+# clientes. Los escenarios de escritura crean ventas reales (la base queda modificada).
+
+import argparse
+import asyncio
+import json
+import platform
+import random
+import subprocess
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+
+from benchmarks.seed_data import ADMIN_EMAIL, BENCH_PASSWORD
+
+USER_EMAIL = "user10@bench.local"
+PERCENTILES = (50, 95, 99)
+LISTING_LIMIT = 100
+
+
+def percentile(sorted_values, pct: float) -> float:
+    """Nearest-rank: el valor bajo el cual queda el pct% de las muestras."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * pct // 100)) # ceil sin floats
+    return sorted_values[int(rank) - 1]
+
+
+def sale_payload(rnd: random.Random, n_products: int) -> dict:
+    product_ids = rnd.sample(range(1, n_products + 1), k=min(n_products, rnd.randint(1, 4)))
+    return {
+        "observation": "benchmark",
+        "medioPago": rnd.choice(["Efectivo", "Transferencia"]),
+        "line_of_sales": [{"product_id": product_id, "cantidad": rnd.randint(1, 3)} for product_id in product_ids],
+    }
+
+
+def build_scenarios(args, admin_headers: dict, user_headers: dict):
+    """nombre -> función(client, rnd) que arma y manda un request."""
+    listing = {"limit": LISTING_LIMIT}
+
+    def get(path, headers=None, params=None):
+        return lambda client, rnd: client.get(path, headers=headers, params=params)
+
+    def write(path, headers):
+        return lambda client, rnd: client.post(
+            path, json=sale_payload(rnd, args.products),
+            headers={**headers, "Idempotency-Key": uuid.uuid4().hex},
+        )
+
+    return {
+        "auth_token": lambda client, rnd: client.post(
+            "/auth/token", data={"username": USER_EMAIL, "password": BENCH_PASSWORD},
+        ),
+        "products": get("/products/"),
+        "sales_all": get("/sales/all", admin_headers, listing),
+        "pedidos_solicitados": get("/sales/pedidos-solicitados", admin_headers, listing),
+        "pendientes_retiro": get("/sales/pendientes-retiro", admin_headers, listing),
+        "ventas": get("/sales/ventas", admin_headers, listing),
+        "create_sale": write("/sales/online", user_headers),
+        "venta_caja": write("/sales/ventas/caja", admin_headers),
+    }
+
+
+async def login(client: httpx.AsyncClient, email: str) -> dict:
+    response = await client.post("/auth/token", data={"username": email, "password": BENCH_PASSWORD})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def run_scenario(client: httpx.AsyncClient, send, duration: float, concurrency: int, seed: int) -> dict:
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + duration
+
+    async def worker(worker_id: int):
+        nonlocal errors
+        rnd = random.Random(seed + worker_id)
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                response = await send(client, rnd)
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            latencies.append(time.perf_counter() - start)
+            if not ok:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    result = {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+    }
+    for pct in PERCENTILES:
+        result[f"p{pct}_ms"] = round(percentile(latencies, pct) * 1000, 2)
+    return result
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "desconocido"
+
+
+async def run(args) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=args.timeout) as client:
+        admin_headers = await login(client, ADMIN_EMAIL)
+        user_headers = await login(client, USER_EMAIL)
+        scenarios = build_scenarios(args, admin_headers, user_headers)
+        selected = args.scenarios or list(scenarios)
+
+        results = {}
+        for name in selected:
+            send = scenarios[name]
+            # Calentamiento: caches en memoria, pool de conexiones, pool de bcrypt
+            await run_scenario(client, send, args.warmup, args.concurrency, args.seed)
+            results[name] = await run_scenario(client, send, args.duration, args.concurrency, args.seed)
+            r = results[name]
+            print(f"{name:22} {r['throughput_rps']:9.1f} req/s  p50 {r['p50_ms']:8.1f}  "
+                  f"p95 {r['p95_ms']:8.1f}  p99 {r['p99_ms']:8.1f} ms  errores {r['errors']}")
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "base_url": args.base_url,
+            "duration_s": args.duration,
+            "warmup_s": args.warmup,
+            "concurrency": args.concurrency,
+            "seed": args.seed,
+            "python": platform.python_version(),
+        },
+        "scenarios": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark HTTP de los endpoints calientes")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--duration", type=float, default=30, help="segundos por escenario")
+    parser.add_argument("--warmup", type=float, default=3, help="segundos de calentamiento por escenario")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--products", type=int, default=300, help="productos cargados por seed_data")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--scenarios", nargs="*", help="sólo estos escenarios (por defecto todos)")
+    parser.add_argument("--output", type=Path, help="archivo JSON de resultados")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    if args.output:
+        args.output.parent.mkdir(parents=True, exist_ok=True)
+        args.output.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+        print(f"Resultados en {args.output}")
+    else:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+# benchmarks/seed_data.py
+# Carga una base local con datos sintéticos de volumen realista para los benchmarks.
+#
+# Uso (desde viandas/backend, contra la base configurada en DATABASE_URL):
+#   python -m benchmarks.seed_data --truncate --users 5000 --products 300 --sales 1000000
+#
+# BORRA todas las tablas de la app (--truncate es obligatorio) y sólo acepta bases en
+# localhost salvo que se pase --force. Con --seed fijo los datos son reproducibles.
+#
+# - Usuarios: admin@bench.local (id 1, admin), el usuario de caja (id 5) y
+#   user<N>@bench.local. Todos con la contraseña BENCH_PASSWORD (un solo bcrypt).
+# - Productos con stock alto para que los benchmarks de escritura no se queden sin stock.
+# - Ventas repartidas en --days días: las viejas registradas/finalizadas, las de los
+#   últimos días en las colas vivas (solicitado/confirmado).
+# Se carga con COPY por tandas y al final se ajustan las secuencias, se recalcula el
+# rollup diario y se corre ANALYZE.
+
+import argparse
+import csv
+import io
+import random
+import sys
+import time
+from datetime import date, timedelta
+from urllib.parse import urlparse
+
+from sqlalchemy import text
+
+from config import engine, DATABASE_URL
+from core.rollups import rebuild_statements
+from core.security import get_password_hash
+
+BENCH_PASSWORD = "bench-password"
+ADMIN_EMAIL = "admin@bench.local"
+CAJA_USER_ID = 5 # routes/sales.crear_venta_en_caja
+COPY_BATCH_SALES = 50_000
+LIVE_QUEUE_DAYS = 2
+
+TABLES = [
+    "daily_sales_rollup", "refresh_tokens", "idempotency_keys", "stock_reservations",
+    '"lineOfSale"', "sales", "products", "users",
+]
+
+# status -> (order_confirmed, sale_in_register, pagado)
+STATUS_FLAGS = {
+    "solicitado": (False, False, False),
+    "confirmado": (True, False, False),
+    "registrado": (True, True, False),
+    "finalizado": (True, True, True),
+}
+
+
+def user_email(user_id: int) -> str:
+    if user_id == 1:
+        return ADMIN_EMAIL
+    if user_id == CAJA_USER_ID:
+        return "caja@bench.local"
+    return f"user{user_id}@bench.local"
+
+
+def copy_rows(raw_conn, table: str, columns, rows) -> None:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows(rows)
+    buffer.seek(0)
+    quoted = ", ".join(f'"{column}"' for column in columns)
+    with raw_conn.cursor() as cursor:
+        cursor.copy_expert(f"COPY {table} ({quoted}) FROM STDIN WITH (FORMAT csv, NULL '')", buffer)
+
+
+def user_rows(n_users: int, hashed_password: str):
+    for user_id in range(1, n_users + 1):
+        yield (
+            user_id, f"Nombre{user_id}", f"Apellido{user_id}", user_email(user_id),
+            f"11{user_id:08d}", hashed_password, True, "admin" if user_id == 1 else "user",
+        )
+
+
+def product_rows(n_products: int, rnd: random.Random):
+    prices = {}
+    rows = []
+    for product_id in range(1, n_products + 1):
+        prices[product_id] = round(rnd.uniform(2500, 9500), 2)
+        rows.append((
+            product_id, f"Vianda {product_id:04d}", prices[product_id], f"Detalle de la vianda {product_id}",
+            True, "", 10_000_000, rnd.randint(5, 50), True, 0,
+        ))
+    return rows, prices
+
+
+def sale_batches(args, rnd: random.Random, prices: dict):
+    """Genera (ventas, líneas) por tandas de COPY_BATCH_SALES ventas."""
+    today = date.today()
+    product_ids = list(prices)
+    # Pocos productos concentran la mayoría de las ventas, como en el menú real
+    weights = [1 / (rank + 1) for rank in range(len(product_ids))]
+    line_id = 1
+    sales, lines = [], []
+    for sale_id in range(1, args.sales + 1):
+        days_ago = int(rnd.random() ** 2 * args.days) # Más ventas en fechas recientes
+        sale_date = today - timedelta(days=days_ago)
+        if days_ago < LIVE_QUEUE_DAYS:
+            status = rnd.choices(["solicitado", "confirmado", "finalizado"], [4, 4, 2])[0]
+        else:
+            status = rnd.choices(["finalizado", "registrado"], [95, 5])[0]
+        is_caja = status == "finalizado" and rnd.random() < 0.3
+        user_id = CAJA_USER_ID if is_caja else rnd.randint(6, args.users) if args.users > 5 else 1
+        confirmed, registered, pagado = STATUS_FLAGS[status]
+
+        quantity, total = 0, 0.0
+        chosen = rnd.choices(product_ids, weights, k=rnd.randint(1, 4))
+        for number, product_id in enumerate(chosen, start=1):
+            cantidad = rnd.randint(1, 3)
+            quantity += cantidad
+            total += cantidad * prices[product_id]
+            lines.append((line_id, cantidad, number, prices[product_id], sale_id, product_id))
+            line_id += 1
+
+        sales.append((
+            sale_id, quantity, "", sale_date.isoformat(), confirmed, registered,
+            rnd.choice(["Efectivo", "Transferencia"]), pagado, status, user_id, round(total, 2),
+        ))
+        if len(sales) >= COPY_BATCH_SALES:
+            yield sales, lines
+            sales, lines = [], []
+    if sales:
+        yield sales, lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Carga datos sintéticos para benchmarks")
+    parser.add_argument("--users", type=int, default=5_000)
+    parser.add_argument("--products", type=int, default=300)
+    parser.add_argument("--sales", type=int, default=1_000_000)
+    parser.add_argument("--days", type=int, default=365, help="días de historia de ventas")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--truncate", action="store_true", help="confirmar que se borran todas las tablas")
+    parser.add_argument("--force", action="store_true", help="permitir una base que no esté en localhost")
+    args = parser.parse_args()
+
+    host = urlparse(DATABASE_URL).hostname
+    if not args.truncate:
+        sys.exit("Este script borra todas las tablas: pasar --truncate para confirmar.")
+    if host not in ("localhost", "127.0.0.1", "::1") and not args.force:
+        sys.exit(f"La base está en {host}, no en localhost: pasar --force si es intencional.")
+    if args.users < CAJA_USER_ID:
+        sys.exit(f"Se necesitan al menos {CAJA_USER_ID} usuarios (el de caja es el id {CAJA_USER_ID}).")
+
+    rnd = random.Random(args.seed)
+    started = time.perf_counter()
+    hashed_password = get_password_hash(BENCH_PASSWORD)
+    products, prices = product_rows(args.products, rnd)
+
+    raw = engine.raw_connection()
+    try:
+        with raw.cursor() as cursor:
+            cursor.execute(f"TRUNCATE {', '.join(TABLES)} RESTART IDENTITY CASCADE")
+        copy_rows(raw, "users", ["id", "name", "apellido", "email", "celular", "hashed_password", "is_active", "role"],
+                  user_rows(args.users, hashed_password))
+        copy_rows(raw, "products", ["id", "nombre", "precioActual", "detalle", "mostrarEnSistema", "foto",
+                                    "stock", "stockMinimo", "is_active", "reserved"], products)
+        loaded = 0
+        for sales, lines in sale_batches(args, rnd, prices):
+            copy_rows(raw, "sales", ["id", "quantity_product", "observation", "date", "order_confirmed",
+                                     "sale_in_register", "medioPago", "pagado", "status", "user_id", "total"], sales)
+            copy_rows(raw, '"lineOfSale"', ["id", "cantidad", "numeroDeLinea", "precio", "sale_id", "product_id"], lines)
+            raw.commit()
+            loaded += len(sales)
+            print(f"  {loaded}/{args.sales} ventas ({time.perf_counter() - started:.0f} s)")
+
+        with raw.cursor() as cursor:
+            for table in ("users", "products", "sales", '"lineOfSale"'):
+                cursor.execute(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT coalesce(max(id), 1) FROM {table}))")
+        raw.commit()
+    finally:
+        raw.close()
+
+    delete_stmt, insert_stmt = rebuild_statements()
+    with engine.begin() as conn:
+        conn.execute(delete_stmt)
+        conn.execute(insert_stmt)
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("ANALYZE"))
+
+    print(f"Listo: {args.users} usuarios, {args.products} productos, {args.sales} ventas "
+          f"en {time.perf_counter() - started:.0f} s. Contraseña: {BENCH_PASSWORD}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+# core/catalog.py
+# Catálogo en memoria de productos activos.
+#
+# El menú cambia pocas veces por día pero se lee en cada vista de la tienda:
+# GET /products/ y GET /products/{id} se responden desde acá, sin sesión de base.
+# - Se carga en forma diferida con la primera lectura.
+# - create/update/delete_product lo invalidan entero.
+# - Los cambios de stock de las ventas se aplican en el lugar (sólo stock/reserved),
+#   usando change_seq para descartar actualizaciones viejas que lleguen desordenadas.
+# - Con varios workers, invalidaciones y cambios de stock se difunden por el broker de eventos.
+
+import asyncio
+import os
+import uuid
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import select
+
+from config import AsyncSessionLocal
+from core.events import broker, CATALOG_CHANNEL
+from core.serialization import product_dict
+from models.models import Product
+
+# Clave en session.info donde se acumulan los cambios de stock de la transacción
+STOCK_CHANGES_KEY = "catalog_stock_changes"
+# Si el catálogo cambia durante la carga, se reintenta; después se sirve sin cachear
+MAX_LOAD_ATTEMPTS = 3
+
+# Identifica a este proceso para ignorar sus propios eventos al volver por el broker
+PROCESS_ID = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+def record_stock_change(db, row) -> None:
+    """
+    Anota el resultado de un UPDATE de stock (RETURNING id, stock, reserved, change_seq).
+    Se aplica al catálogo recién con publish_stock_changes, después del commit.
+    """
+    db.info.setdefault(STOCK_CHANGES_KEY, {})[row.id] = (row.stock, row.reserved, row.change_seq)
+
+
+class ProductCatalog:
+    """Productos activos ordenados por nombre, como dicts listos para serializar."""
+
+    def __init__(self):
+        # Cada cambio incrementa la versión; una carga sólo se guarda si no hubo cambios mientras corría
+        self.version = 0
+        # Dict en orden de nombre; reemplazar una entrada conserva su posición
+        self._by_id: Optional[Dict[int, Dict[str, Any]]] = None
+        self._seqs: Dict[int, int] = {}
+        self._load_lock = asyncio.Lock()
+
+    async def _fetch(self):
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(Product).where(Product.is_active == True).order_by(Product.nombre)
+            )
+            return result.scalars().all()
+
+    async def _ensure_loaded(self) -> Dict[int, Dict[str, Any]]:
+        if self._by_id is not None:
+            return self._by_id
+        async with self._load_lock: # Una sola carga aunque lleguen muchas lecturas juntas
+            for _ in range(MAX_LOAD_ATTEMPTS):
+                if self._by_id is not None:
+                    return self._by_id
+                version = self.version
+                products = await self._fetch()
+                by_id = {product.id: product_dict(product) for product in products}
+                if version == self.version:
+                    self._by_id = by_id
+                    self._seqs = {product.id: product.change_seq for product in products}
+                    return by_id
+            return by_id # Catálogo muy movido: se responde con la última lectura sin guardarla
+
+    async def list(self, skip: int = 0, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        products = list((await self._ensure_loaded()).values())
+        end = None if limit is None else skip + limit
+        return products[skip:end]
+
+    async def get(self, product_id: int) -> Optional[Dict[str, Any]]:
+        return (await self._ensure_loaded()).get(product_id)
+
+    def invalidate(self) -> None:
+        self.version += 1
+        self._by_id = None
+
+    def apply_stock(self, changes: Dict[int, tuple]) -> None:
+        """Actualiza stock/reserved de los productos cargados, ignorando cambios más viejos que los vistos."""
+        self.version += 1
+        if self._by_id is None:
+            return
+        for product_id, (stock, reserved, change_seq) in changes.items():
+            current = self._by_id.get(product_id)
+            if current is None or change_seq <= self._seqs.get(product_id, 0):
+                continue
+            # Se reemplaza el dict (no se modifica) por si hay una respuesta serializándose
+            self._by_id[product_id] = {**current, "stock": stock, "reserved": reserved, "available": stock - reserved}
+            self._seqs[product_id] = change_seq
+
+    async def listen(self) -> None:
+        """Aplica las invalidaciones y cambios de stock publicados por otros procesos."""
+        async with broker.subscribe(CATALOG_CHANNEL) as queue:
+            while True:
+                event = await queue.get()
+                if event.get("origin") == PROCESS_ID:
+                    continue
+                if event["type"] == "catalog.invalidate":
+                    self.invalidate()
+                elif event["type"] == "catalog.stock":
+                    self.apply_stock({int(product_id): tuple(values) for product_id, values in event["products"].items()})
+
+
+catalog = ProductCatalog()
+
+
+async def _broadcast(event: dict) -> None:
+    try:
+        await broker.publish(CATALOG_CHANNEL, {**event, "origin": PROCESS_ID})
+    except Exception as e:
+        print(f"Error difundiendo evento de catálogo {event['type']}: {e}")
+
+
+async def invalidate_catalog() -> None:
+    """Invalida el catálogo local y el de los demás procesos. Llamar después del commit."""
+    catalog.invalidate()
+    await _broadcast({"type": "catalog.invalidate"})
+
+
+async def publish_stock_changes(db) -> None:
+    """Aplica y difunde los cambios de stock anotados en la sesión. Llamar después del commit."""
+    changes = db.info.pop(STOCK_CHANGES_KEY, None)
+    if not changes:
+        return
+    catalog.apply_stock(changes)
+    # Claves str: el payload viaja como JSON por NOTIFY
+    await _broadcast({"type": "catalog.stock", "products": {str(k): list(v) for k, v in changes.items()}})
+
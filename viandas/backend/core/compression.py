@@ -0,0 +1,132 @@
+# core/compression.py
+# Middleware ASGI de compresión negociada (brotli o gzip) para respuestas JSON grandes.
+#
+# - Sólo comprime respuestas de un único mensaje: los streams (export, SSE) pasan tal cual.
+# - La compresión corre en el threadpool para no bloquear el event loop con cuerpos grandes.
+# - Para los GET cacheables (catálogo de productos) guarda los cuerpos ya comprimidos,
+#   indexados por el hash del cuerpo: si el contenido no cambió se reutilizan sin recomprimir.
+
+import gzip
+import hashlib
+from collections import OrderedDict
+from typing import Optional, Sequence
+
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional: sin él se negocia sólo gzip
+    brotli = None
+
+MINIMUM_SIZE = 1024 # Debajo de esto la compresión no compensa
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5 # Calidad media: buena relación tamaño/CPU para respuestas dinámicas
+CACHEABLE_PATHS = ("/products",)
+CACHE_MAX_ENTRIES = 64
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "image/svg+xml")
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Elige 'br' o 'gzip' según el header Accept-Encoding (respeta q=0)."""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+class CompressionMiddleware:
+    def __init__(
+        self,
+        app,
+        minimum_size: int = MINIMUM_SIZE,
+        cacheable_paths: Sequence[str] = CACHEABLE_PATHS,
+        cache_max_entries: int = CACHE_MAX_ENTRIES,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.cacheable_paths = tuple(cacheable_paths)
+        self.cache_max_entries = cache_max_entries
+        self._cache: "OrderedDict[tuple, bytes]" = OrderedDict()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        # Sin encoding aceptable igual se envuelve la respuesta: lleva Vary aunque no se comprima
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        cacheable = scope["method"] == "GET" and scope["path"].startswith(self.cacheable_paths)
+        start_message = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+            if message["type"] == "http.response.start":
+                start_message = message # Se retiene hasta ver el cuerpo
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            headers = MutableHeaders(raw=start_message["headers"])
+            compressible = (
+                "content-encoding" not in headers
+                and headers.get("content-type", "").startswith(COMPRESSIBLE_TYPES)
+            )
+            if compressible:
+                # La misma URL puede salir comprimida o no según Accept-Encoding: los caches
+                # compartidos tienen que distinguir las variantes aunque esta vaya sin comprimir
+                headers.add_vary_header("Accept-Encoding")
+            if (
+                not compressible
+                or encoding is None
+                or message.get("more_body", False) # Streaming: export, SSE
+                or len(body) < self.minimum_size
+            ):
+                passthrough = True
+                await send(start_message)
+                await send(message)
+                return
+
+            use_cache = cacheable and start_message["status"] == 200
+            compressed = await self._compressed(body, encoding, use_cache)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            await send(start_message)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_wrapper)
+
+    async def _compressed(self, body: bytes, encoding: str, use_cache: bool) -> bytes:
+        if not use_cache:
+            return await run_in_threadpool(compress, body, encoding)
+        key = (encoding, hashlib.blake2b(body, digest_size=16).digest())
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            return cached
+        compressed = await run_in_threadpool(compress, body, encoding)
+        self._cache[key] = compressed
+        if len(self._cache) > self.cache_max_entries:
+            self._cache.popitem(last=False) # LRU
+        return compressed
@@ -0,0 +1,152 @@
+# core/events.py
+# Broker de eventos pluggable para publicar cambios de ventas (y otros) a los clientes.
+#
+# - InProcessBroker: colas asyncio dentro del proceso. Sirve con un solo worker.
+# - PostgresBroker: publica con NOTIFY y escucha con LISTEN en una conexión dedicada,
+#   así un evento publicado por cualquier worker llega a los suscriptores de todos.
+
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Dict, Optional, Set
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+from config import EVENT_BROKER, ASYNC_DATABASE_URL
+
+SALES_CHANNEL = "sales_events"
+CATALOG_CHANNEL = "catalog_events" # Invalidaciones del catálogo en memoria (core/catalog.py)
+IDENTITY_CHANNEL = "identity_events" # Invalidaciones del cache de identidad (core/identity.py)
+STOCK_CHANNEL = "stock_events" # Cruces del umbral de stock mínimo (core/low_stock.py)
+SUBSCRIBER_QUEUE_SIZE = 100
+SSE_HEARTBEAT_SECONDS = 15
+
+
+class InProcessBroker:
+    """Fan-out en memoria: cada suscriptor tiene su propia cola acotada."""
+
+    def __init__(self):
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    async def publish(self, channel: str, event: dict) -> None:
+        self._deliver(channel, event)
+
+    def _deliver(self, channel: str, event: dict) -> None:
+        for queue in self._subscribers.get(channel, ()):
+            if queue.full():
+                # Un cliente lento no frena a los demás: se descarta su evento más viejo
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    @asynccontextmanager
+    async def subscribe(self, channel: str) -> AsyncIterator[asyncio.Queue]:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers.setdefault(channel, set()).add(queue)
+        try:
+            yield queue
+        finally:
+            self._subscribers[channel].discard(queue)
+
+
+class PostgresBroker(InProcessBroker):
+    """
+    LISTEN/NOTIFY sobre Postgres. Cada proceso mantiene una conexión asyncpg que escucha
+    los canales y reparte los eventos a sus suscriptores locales.
+    Los payloads de NOTIFY están limitados a ~8000 bytes: los eventos deben ser deltas chicos.
+    """
+
+    def __init__(self, dsn: str, channels=(SALES_CHANNEL, CATALOG_CHANNEL, IDENTITY_CHANNEL, STOCK_CHANNEL)):
+        super().__init__()
+        self._dsn = dsn
+        self._channels = tuple(channels)
+        self._listen_conn = None
+        self._publish_conn = None
+        self._publish_lock = asyncio.Lock()
+
+    async def start(self) -> None:
+        import asyncpg # Sólo hace falta con EVENT_BROKER=postgres
+
+        self._listen_conn = await asyncpg.connect(self._dsn)
+        self._publish_conn = await asyncpg.connect(self._dsn)
+        for channel in self._channels:
+            await self._listen_conn.add_listener(channel, self._on_notify)
+
+    async def stop(self) -> None:
+        for conn in (self._listen_conn, self._publish_conn):
+            if conn is not None:
+                await conn.close()
+
+    def _on_notify(self, connection, pid, channel, payload) -> None:
+        self._deliver(channel, json.loads(payload))
+
+    async def publish(self, channel: str, event: dict) -> None:
+        async with self._publish_lock:
+            await self._publish_conn.execute("SELECT pg_notify($1, $2)", channel, json.dumps(event, default=str))
+
+
+def create_broker():
+    if EVENT_BROKER == "postgres":
+        # asyncpg usa el DSN plano de Postgres, sin el sufijo del driver de SQLAlchemy
+        return PostgresBroker(ASYNC_DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://", 1))
+    return InProcessBroker()
+
+
+broker = create_broker()
+
+
+def sale_event(event_type: str, sale) -> dict:
+    """Delta chico de una venta: estado y datos de cabecera, sin líneas ni entidades anidadas."""
+    return {
+        "type": event_type,
+        "sale": {
+            "id": sale.id,
+            "status": sale.status,
+            "date": sale.date.isoformat() if sale.date else None,
+            "user_id": sale.user_id,
+            "quantity_product": sale.quantity_product,
+            "medioPago": sale.medioPago,
+            "order_confirmed": sale.order_confirmed,
+            "sale_in_register": sale.sale_in_register,
+            "pagado": sale.pagado,
+        },
+    }
+
+
+async def publish_sale_event(event_type: str, sale) -> None:
+    """Publica un evento de venta. Se llama después del commit; un fallo no afecta la request."""
+    try:
+        await broker.publish(SALES_CHANNEL, sale_event(event_type, sale))
+    except Exception as e:
+        print(f"Error publicando evento {event_type} de la venta {sale.id}: {e}")
+
+
+def sse_response(request: Request, channel: str, predicate: Optional[Callable[[dict], bool]] = None) -> StreamingResponse:
+    """
+    Stream text/event-stream con los eventos de `channel`.
+    Con `predicate` sólo se envían los eventos para los que devuelve True.
+    """
+    async def event_generator():
+        async with broker.subscribe(channel) as queue:
+            yield "retry: 5000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n" # Evita que proxies corten la conexión inactiva
+                    continue
+                if predicate is not None and not predicate(event):
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
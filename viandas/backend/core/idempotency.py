@@ -0,0 +1,86 @@
+# core/idempotency.py
+# Soporte para el header Idempotency-Key en los endpoints que crean ventas.
+#
+# La primera request con una clave toma un advisory lock de Postgres dentro de su
+# transacción, crea la venta y guarda la respuesta serializada en la misma transacción.
+# Un duplicado concurrente espera ese lock y, al obtenerlo, encuentra la respuesta guardada.
+
+import hashlib
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from fastapi import HTTPException, status
+from pydantic import BaseModel
+from sqlalchemy import select, delete, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.models import IdempotencyKey
+
+IDEMPOTENCY_TTL = timedelta(hours=24)
+MAX_KEY_LENGTH = 255
+
+
+def request_fingerprint(payload: BaseModel) -> str:
+    """Hash del cuerpo de la request, para detectar claves reutilizadas con otro contenido."""
+    return hashlib.sha256(payload.model_dump_json().encode()).hexdigest()
+
+
+async def acquire(db: AsyncSession, scope: str, key: str) -> None:
+    """
+    Toma un advisory lock transaccional para (scope, key). Se libera solo en el commit/rollback,
+    así las requests duplicadas en vuelo quedan esperando a la primera.
+    """
+    if len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Idempotency-Key demasiado larga (máximo {MAX_KEY_LENGTH} caracteres)."
+        )
+    await db.execute(select(func.pg_advisory_xact_lock(func.hashtext(f"{scope}:{key}"))))
+
+
+async def lookup(db: AsyncSession, scope: str, key: str, fingerprint: str) -> Optional[dict]:
+    """Devuelve la respuesta guardada para la clave (si no venció) o None."""
+    record = (await db.execute(
+        select(IdempotencyKey).where(
+            IdempotencyKey.scope == scope,
+            IdempotencyKey.key == key,
+            IdempotencyKey.expires_at > func.now(),
+        )
+    )).scalar_one_or_none()
+    if record is None:
+        return None
+    if record.request_hash != fingerprint:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="La Idempotency-Key ya fue usada con un pedido distinto."
+        )
+    return record.response_body
+
+
+async def store(db: AsyncSession, scope: str, key: str, fingerprint: str, response_body: dict) -> None:
+    """Guarda la respuesta en la transacción actual (reemplaza una entrada vencida si existe)."""
+    now = datetime.now(timezone.utc)
+    values = dict(
+        scope=scope,
+        key=key,
+        request_hash=fingerprint,
+        response_body=response_body,
+        created_at=now,
+        expires_at=now + IDEMPOTENCY_TTL,
+    )
+    stmt = insert(IdempotencyKey).values(**values)
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=[IdempotencyKey.scope, IdempotencyKey.key],
+        set_={k: stmt.excluded[k] for k in ("request_hash", "response_body", "created_at", "expires_at")},
+    ))
+
+
+async def purge_expired_keys(db: AsyncSession) -> int:
+    """Borra las claves vencidas. Pensado para correr con core.tasks.run_periodically."""
+    result = await db.execute(
+        delete(IdempotencyKey)
+        .where(IdempotencyKey.expires_at <= func.now())
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
@@ -0,0 +1,73 @@
+# core/identity.py
+# Cache acotado (LRU + TTL) de la identidad del usuario autenticado.
+#
+# La mayoría de las rutas sólo necesitan id y rol del usuario del token, no el User ORM
+# completo. Con este cache esas rutas resuelven la identidad sin ninguna consulta.
+# Se invalida cuando cambia el usuario (y se difunde a los demás workers por el broker);
+# el TTL acota cualquier otra desactualización.
+
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from core.events import broker, IDENTITY_CHANNEL
+
+IDENTITY_TTL_SECONDS = 60
+IDENTITY_CACHE_SIZE = 4096
+
+
+@dataclass(frozen=True)
+class Identity:
+    id: int
+    email: str
+    role: str
+    is_active: bool
+
+
+class IdentityCache:
+    """LRU con vencimiento por entrada, indexado por el `sub` del JWT (email)."""
+
+    def __init__(self, max_entries: int = IDENTITY_CACHE_SIZE, ttl_seconds: float = IDENTITY_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, subject: str) -> Optional[Identity]:
+        entry = self._entries.get(subject)
+        if entry is None:
+            return None
+        identity, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._entries[subject]
+            return None
+        self._entries.move_to_end(subject)
+        return identity
+
+    def put(self, subject: str, identity: Identity) -> None:
+        self._entries[subject] = (identity, time.monotonic() + self.ttl_seconds)
+        self._entries.move_to_end(subject)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, subject: str) -> None:
+        self._entries.pop(subject, None)
+
+    async def listen(self) -> None:
+        """Aplica las invalidaciones publicadas por otros workers."""
+        async with broker.subscribe(IDENTITY_CHANNEL) as queue:
+            while True:
+                event = await queue.get()
+                self.invalidate(event["subject"])
+
+
+identity_cache = IdentityCache()
+
+
+async def invalidate_identity(subject: str) -> None:
+    """Invalida la identidad en este proceso y en los demás. Llamar después del commit."""
+    identity_cache.invalidate(subject)
+    try:
+        await broker.publish(IDENTITY_CHANNEL, {"type": "identity.invalidate", "subject": subject})
+    except Exception as e:
+        print(f"Error difundiendo invalidación de identidad: {e}")
@@ -0,0 +1,190 @@
+# core/images.py
+# Subida de imágenes de productos con almacenamiento direccionado por contenido.
+#
+# - El archivo se escribe a disco por bloques mientras se calcula su sha256; el nombre
+#   final es el hash, así dos subidas iguales comparten el mismo archivo.
+# - Las variantes WebP (thumb y medium) se generan en un pool de procesos, fuera del
+#   request. Mientras no existan, ImmutableStaticFiles sirve el original.
+# - Como un nombre con hash nunca cambia de contenido, se sirven con cache inmutable.
+
+import asyncio
+import hashlib
+import os
+import re
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException, UploadFile, status
+from fastapi.staticfiles import StaticFiles
+from starlette.concurrency import run_in_threadpool
+from starlette.exceptions import HTTPException as StarletteHTTPException
+
+STATIC_DIR = Path("static")
+PRODUCT_IMAGE_DIR = STATIC_DIR / "product_images"
+PRODUCT_IMAGE_URL = "/static/product_images"
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024 # 1 MiB
+MAX_UPLOAD_BYTES = 10 * 1024 * 1024
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+
+# variante -> lado máximo en píxeles
+VARIANTS = {"thumb": 320, "medium": 960}
+WEBP_QUALITY = 80
+
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+# <sha256>.<ext> o <sha256>-<variante>.webp
+HASHED_NAME = re.compile(r"^(?P<digest>[0-9a-f]{64})(-(?P<variant>[a-z]+))?\.(?P<ext>[a-z]+)$")
+
+# Firma de los primeros bytes -> extensión. Sólo se aceptan estos formatos.
+_SIGNATURES = [
+    (b"\xff\xd8\xff", "jpg"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+]
+
+
+def _detect_extension(head: bytes) -> Optional[str]:
+    for signature, ext in _SIGNATURES:
+        if head.startswith(signature):
+            return ext
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+def variant_name(digest: str, variant: str) -> str:
+    return f"{digest}-{variant}.webp"
+
+
+def variant_urls(digest: str) -> Dict[str, str]:
+    return {variant: f"{PRODUCT_IMAGE_URL}/{variant_name(digest, variant)}" for variant in VARIANTS}
+
+
+async def save_upload(file: UploadFile) -> Tuple[str, Path]:
+    """
+    Escribe la subida a disco por bloques calculando el sha256.
+    Devuelve (digest, ruta del original). Si el contenido ya existía no se duplica.
+    """
+    PRODUCT_IMAGE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = PRODUCT_IMAGE_DIR / f".upload-{uuid.uuid4().hex}"
+    digest = hashlib.sha256()
+    size = 0
+    ext = None
+    out = await run_in_threadpool(open, tmp_path, "wb")
+    try:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            if ext is None:
+                ext = _detect_extension(chunk[:16])
+                if ext is None:
+                    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Formato de imagen no soportado (JPEG, PNG o WebP).")
+            size += len(chunk)
+            if size > MAX_UPLOAD_BYTES:
+                raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=f"La imagen supera los {MAX_UPLOAD_BYTES // (1024 * 1024)} MB.")
+            digest.update(chunk)
+            await run_in_threadpool(out.write, chunk)
+    except BaseException:
+        out.close()
+        tmp_path.unlink(missing_ok=True)
+        raise
+    await run_in_threadpool(out.close)
+
+    if ext is None:
+        tmp_path.unlink(missing_ok=True)
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="El archivo está vacío.")
+
+    hex_digest = digest.hexdigest()
+    final_path = PRODUCT_IMAGE_DIR / f"{hex_digest}.{ext}"
+    if final_path.exists():
+        tmp_path.unlink(missing_ok=True) # Mismo contenido ya subido
+    else:
+        os.replace(tmp_path, final_path)
+    return hex_digest, final_path
+
+
+def _make_variants(source: str, digest: str) -> int:
+    """Corre en el pool de procesos: genera las variantes WebP que falten. Devuelve cuántas creó."""
+    from PIL import Image, ImageOps # Pillow sólo se importa en los workers
+
+    created = 0
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image) # Respetar la orientación de las fotos de celular
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+        for variant, max_side in VARIANTS.items():
+            target = PRODUCT_IMAGE_DIR / variant_name(digest, variant)
+            if target.exists():
+                continue
+            resized = image.copy()
+            resized.thumbnail((max_side, max_side))
+            tmp_target = target.with_name(f".{target.name}.{os.getpid()}")
+            resized.save(tmp_target, "WEBP", quality=WEBP_QUALITY, method=4)
+            os.replace(tmp_target, target)
+            created += 1
+    return created
+
+
+_executor: Optional[ProcessPoolExecutor] = None
+_pending = set() # Referencias a las tareas en curso para que no las recolecte el GC
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+    return _executor
+
+
+def schedule_variants(source: Path, digest: str) -> None:
+    """Encola la generación de variantes sin esperar el resultado."""
+    if all((PRODUCT_IMAGE_DIR / variant_name(digest, variant)).exists() for variant in VARIANTS):
+        return
+    future = asyncio.get_running_loop().run_in_executor(_get_executor(), _make_variants, str(source), digest)
+    _pending.add(future)
+
+    def _done(fut):
+        _pending.discard(fut)
+        if fut.exception() is not None:
+            print(f"Error generando variantes de la imagen {digest}: {fut.exception()}")
+
+    future.add_done_callback(_done)
+
+
+def shutdown_executor() -> None:
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+
+
+class ImmutableStaticFiles(StaticFiles):
+    """
+    StaticFiles con cache inmutable para nombres direccionados por contenido.
+    Si una variante todavía no se generó, sirve el original (sin cache inmutable).
+    """
+
+    async def get_response(self, path: str, scope):
+        try:
+            return await super().get_response(path, scope)
+        except StarletteHTTPException as exc:
+            fallback = self._original_for_variant(path) if exc.status_code == 404 else None
+            if fallback is None:
+                raise
+            response = await super().get_response(fallback, scope)
+            response.headers["Cache-Control"] = "no-cache"
+            return response
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        if HASHED_NAME.match(os.path.basename(full_path)):
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE
+        return response
+
+    def _original_for_variant(self, path: str) -> Optional[str]:
+        directory, name = os.path.split(path)
+        match = HASHED_NAME.match(name)
+        if not match or not match.group("variant"):
+            return None
+        for _, ext in _SIGNATURES + [(None, "webp")]:
+            candidate = os.path.join(directory, f"{match.group('digest')}.{ext}")
+            if os.path.exists(os.path.join(self.directory, candidate)):
+                return candidate
+        return None
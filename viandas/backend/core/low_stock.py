@@ -0,0 +1,39 @@
+# core/low_stock.py
+# Alertas de stock bajo (stock <= stockMinimo).
+#
+# La lista de productos bajo el mínimo sale del índice parcial ix_products_low_stock.
+# Los eventos se generan sólo cuando un cambio cruza el umbral (stock_before vs stock_after),
+# no en cada venta: product.low_stock al caer al mínimo o debajo, product.stock_recovered
+# al volver a superarlo. Se anotan en la sesión y se publican después del commit.
+
+from core.events import broker, STOCK_CHANNEL
+
+# Clave en session.info donde se acumulan los cruces de la transacción
+CROSSINGS_KEY = "low_stock_crossings"
+
+
+def is_low(stock: int, stock_minimo: int) -> bool:
+    return stock <= stock_minimo
+
+
+def record_crossing(db, product_id: int, was_low: bool, stock: int, stock_minimo: int) -> None:
+    """Anota un cruce del umbral si el estado cambió. `stock`/`stock_minimo` son los valores nuevos."""
+    now_low = is_low(stock, stock_minimo)
+    if now_low == was_low:
+        return
+    db.info.setdefault(CROSSINGS_KEY, {})[product_id] = {
+        "type": "product.low_stock" if now_low else "product.stock_recovered",
+        "product": {"id": product_id, "stock": stock, "stockMinimo": stock_minimo},
+    }
+
+
+async def publish_low_stock_events(db) -> None:
+    """Publica los cruces anotados en la sesión. Llamar después del commit."""
+    crossings = db.info.pop(CROSSINGS_KEY, None)
+    if not crossings:
+        return
+    for event in crossings.values():
+        try:
+            await broker.publish(STOCK_CHANNEL, event)
+        except Exception as e:
+            print(f"Error publicando evento {event['type']} del producto {event['product']['id']}: {e}")
@@ -0,0 +1,187 @@
+# core/metrics.py
+# Métricas en formato Prometheus (GET /metrics).
+#
+# - Latencia por ruta (histograma) y requests en vuelo, desde un middleware ASGI.
+# - Pool de conexiones de SQLAlchemy: conexiones en uso, overflow y espera para obtener una.
+# - Duración de los UPDATE condicionales de stock (incluye la espera por el lock de fila).
+# - Duración y tiempo de cola de bcrypt (core/passwords.py).
+#
+# Con varios workers (gunicorn/uvicorn --workers) definir PROMETHEUS_MULTIPROC_DIR apuntando
+# a un directorio vacío: cada proceso escribe sus valores ahí y /metrics los agrega.
+# Con gunicorn, llamar a prometheus_client.multiprocess.mark_process_dead(worker.pid) en child_exit.
+# prometheus_client es opcional: sin él las métricas no registran nada y /metrics responde 503.
+
+import os
+import time
+
+from starlette.routing import Match
+
+try:
+    import prometheus_client
+    from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, CONTENT_TYPE_LATEST
+    from prometheus_client import multiprocess
+except ImportError:  # prometheus_client es opcional
+    prometheus_client = None
+    Counter = Gauge = Histogram = None
+
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LOCK_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0, 5.0)
+BCRYPT_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.5, 1.0, 2.0, 5.0)
+
+
+class _NoopMetric:
+    """Reemplazo sin efecto cuando prometheus_client no está instalado."""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, value):
+        pass
+
+    def inc(self, amount=1):
+        pass
+
+    def dec(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+
+def _metric(kind, *args, **kwargs):
+    if kind is None:
+        return _NoopMetric()
+    if kind is Gauge:
+        # En multiproceso los gauges de cada worker se suman
+        kwargs.setdefault("multiprocess_mode", "livesum")
+    return kind(*args, **kwargs)
+
+
+REQUEST_LATENCY = _metric(
+    Histogram, "http_request_duration_seconds",
+    "Latencia de las requests HTTP", ["method", "route", "status"], buckets=LATENCY_BUCKETS,
+)
+REQUESTS_IN_FLIGHT = _metric(
+    Gauge, "http_requests_in_flight",
+    "Requests HTTP en curso", ["method", "route"],
+)
+REQUEST_ERRORS = _metric(
+    Counter, "http_request_errors_total",
+    "Respuestas 5xx y excepciones no manejadas", ["method", "route"],
+)
+DB_POOL_CHECKED_OUT = _metric(
+    Gauge, "db_pool_checked_out_connections",
+    "Conexiones del pool en uso", ["engine"],
+)
+DB_POOL_OVERFLOW = _metric(
+    Gauge, "db_pool_overflow_connections",
+    "Conexiones abiertas por encima de pool_size", ["engine"],
+)
+DB_POOL_CHECKOUTS = _metric(
+    Counter, "db_pool_checkouts_total",
+    "Conexiones entregadas por el pool", ["engine"],
+)
+DB_POOL_WAIT = _metric(
+    Histogram, "db_pool_checkout_wait_seconds",
+    "Espera para obtener una conexión del pool", ["engine"], buckets=LOCK_BUCKETS,
+)
+STOCK_LOCK_WAIT = _metric(
+    Histogram, "stock_update_lock_seconds",
+    "Duración de los UPDATE condicionales de stock (uno por operación), incluida la espera por los locks de las filas",
+    ["operation"], buckets=LOCK_BUCKETS,
+)
+BCRYPT_DURATION = _metric(
+    Histogram, "bcrypt_duration_seconds",
+    "Duración de bcrypt en el pool de procesos", ["operation"], buckets=BCRYPT_BUCKETS,
+)
+BCRYPT_QUEUE_TIME = _metric(
+    Histogram, "bcrypt_queue_seconds",
+    "Espera de las operaciones de bcrypt antes de correr", ["operation"], buckets=LATENCY_BUCKETS,
+)
+
+
+def instrument_pool(engine, name: str) -> None:
+    """Registra los eventos del pool de `engine` (sync o `async_engine.sync_engine`)."""
+    from sqlalchemy import event
+
+    pool = engine.pool
+    if not hasattr(pool, "checkedout"): # NullPool/StaticPool: no hay nada que medir
+        return
+
+    def _update_gauges():
+        DB_POOL_CHECKED_OUT.labels(name).set(pool.checkedout())
+        DB_POOL_OVERFLOW.labels(name).set(max(pool.overflow(), 0))
+
+    # Eventos sobre el engine: se conservan si el pool se recrea (engine.dispose())
+    @event.listens_for(engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        DB_POOL_CHECKOUTS.labels(name).inc()
+        _update_gauges()
+
+    @event.listens_for(engine, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        _update_gauges()
+
+    # El pool no tiene evento de "empezó a esperar": se mide envolviendo _do_get
+    original_do_get = pool._do_get
+
+    def _timed_do_get():
+        started = time.perf_counter()
+        try:
+            return original_do_get()
+        finally:
+            DB_POOL_WAIT.labels(name).observe(time.perf_counter() - started)
+
+    pool._do_get = _timed_do_get
+
+
+def _route_label(app, scope) -> str:
+    """Plantilla de la ruta (p.ej. /sales/{sale_id}/confirm) para no crear una serie por id."""
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", scope["path"])
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    def __init__(self, app, fastapi_app=None):
+        self.app = app
+        self.fastapi_app = fastapi_app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or prometheus_client is None or scope["path"] == "/metrics":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = _route_label(self.fastapi_app, scope)
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        in_flight = REQUESTS_IN_FLIGHT.labels(method, route)
+        in_flight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_flight.dec()
+            REQUEST_LATENCY.labels(method, route, str(status_code)).observe(time.perf_counter() - started)
+            if status_code >= 500:
+                REQUEST_ERRORS.labels(method, route).inc()
+
+
+def render_metrics():
+    """(cuerpo, content-type) en formato de texto de Prometheus, agregando los workers si corresponde."""
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return prometheus_client.generate_latest(registry), CONTENT_TYPE_LATEST
+    return prometheus_client.generate_latest(), CONTENT_TYPE_LATEST
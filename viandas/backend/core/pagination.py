@@ -0,0 +1,104 @@
+# core/pagination.py
+# Paginación por keyset (cursor) para listados ordenados.
+#
+# En lugar de OFFSET, cada página arranca después de la última fila de la anterior:
+# WHERE (date, id) < (:date, :id) ORDER BY date DESC, id DESC LIMIT :limit.
+# El cursor que recibe el cliente es opaco (base64 de los valores de la última fila).
+
+import base64
+import json
+from datetime import date
+from typing import List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import func, literal_column, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+DEFAULT_PAGE_LIMIT = 100
+MAX_PAGE_LIMIT = 500
+
+# Una fila cambiada hace menos de esto puede pertenecer a una transacción que tomó un
+# change_seq más bajo que otra ya commiteada; el cursor de delta sync no la pasa de largo
+SYNC_SETTLE_INTERVAL = "5 seconds"
+
+
+def _to_json(value):
+    return value.isoformat() if isinstance(value, date) else value
+
+
+def encode_cursor(row, columns: Sequence) -> str:
+    values = [_to_json(getattr(row, column.key)) for column in columns]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor: str, columns: Sequence) -> Tuple:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if len(values) != len(columns):
+            raise ValueError("cantidad de valores incorrecta")
+        return tuple(
+            date.fromisoformat(value) if column.type.python_type is date else column.type.python_type(value)
+            for column, value in zip(columns, values)
+        )
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Cursor inválido: {e}")
+
+
+async def fetch_page(
+    db: AsyncSession,
+    stmt,
+    columns: Sequence,
+    descending: bool,
+    cursor: Optional[str],
+    limit: Optional[int],
+) -> Tuple[List, Optional[str]]:
+    """
+    Ejecuta `stmt` (un select de entidades, sin ORDER BY) ordenado por `columns` y
+    devuelve (filas, next_cursor). next_cursor es None en la última página.
+    Con limit=None devuelve todas las filas desde el cursor, en una sola página.
+    """
+    if cursor:
+        key = tuple_(*columns)
+        bound = tuple_(*decode_cursor(cursor, columns))
+        stmt = stmt.where(key < bound if descending else key > bound)
+
+    order = [column.desc() if descending else column.asc() for column in columns]
+    if limit is None:
+        result = await db.execute(stmt.order_by(*order))
+        return result.scalars().all(), None
+
+    # Se pide una fila de más para saber si hay otra página sin hacer un COUNT
+    result = await db.execute(stmt.order_by(*order).limit(limit + 1))
+    rows = result.scalars().all()
+
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(rows[-1], columns)
+    return rows, None
+
+
+async def fetch_changes(db: AsyncSession, stmt, model, since: int, limit: int) -> Tuple[List, int]:
+    """
+    Delta sync: devuelve (filas con change_seq > since ordenadas por change_seq, next_since).
+
+    Las secuencias se asignan al escribir pero se ven al commitear, así que un change_seq
+    bajo puede aparecer después de uno alto. next_since avanza sólo hasta la última fila
+    anterior a la primera cambiada dentro de SYNC_SETTLE_INTERVAL, también cuando la
+    página está llena: las filas siguientes se vuelven a enviar en el próximo pedido
+    (el cliente aplica upserts por id, repetir una fila es inofensivo).
+    """
+    settled = model.updated_at < func.now() - literal_column(f"interval '{SYNC_SETTLE_INTERVAL}'")
+    result = await db.execute(
+        stmt.add_columns(settled.label("settled"))
+        .where(model.change_seq > since)
+        .order_by(model.change_seq)
+        .limit(limit)
+    )
+    pairs = result.all()
+
+    next_since = since
+    for row, is_settled in pairs:
+        if not is_settled:
+            break
+        next_since = row.change_seq
+    return [row for row, _ in pairs], next_since
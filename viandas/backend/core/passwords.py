@@ -0,0 +1,101 @@
+# core/passwords.py
+# bcrypt en un pool de procesos dedicado.
+#
+# Cada hash/verify de bcrypt son ~100-300 ms de CPU. En el threadpool compiten con el GIL
+# y agotan los threads de la app en un pico de logins; acá corren en procesos aparte con
+# un límite de operaciones simultáneas. Se mide cuánto espera cada operación en cola y
+# cuánto tarda el bcrypt en sí.
+
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+
+from core.security import pwd_context
+from core.metrics import BCRYPT_DURATION, BCRYPT_QUEUE_TIME
+
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Operaciones en vuelo (en el pool o esperando worker). El resto espera en el semáforo.
+PASSWORD_MAX_CONCURRENCY = int(os.getenv("PASSWORD_MAX_CONCURRENCY", str(PASSWORD_WORKERS * 2)))
+
+
+class PasswordPoolStats:
+    """Métricas acumuladas del pool (tiempos en segundos)."""
+
+    def __init__(self):
+        self.operations = 0
+        self.waiting = 0
+        self.queue_time_total = 0.0
+        self.queue_time_max = 0.0
+        self.work_time_total = 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "operations": self.operations,
+            "waiting": self.waiting,
+            "queue_time_avg": self.queue_time_total / self.operations if self.operations else 0.0,
+            "queue_time_max": self.queue_time_max,
+            "work_time_avg": self.work_time_total / self.operations if self.operations else 0.0,
+        }
+
+
+stats = PasswordPoolStats()
+
+_executor: Optional[ProcessPoolExecutor] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def _timed_hash(password: str) -> Tuple[str, float]:
+    started = time.perf_counter()
+    return pwd_context.hash(password), time.perf_counter() - started
+
+
+def _timed_verify_and_update(password: str, hashed: str) -> Tuple[Tuple[bool, Optional[str]], float]:
+    started = time.perf_counter()
+    return pwd_context.verify_and_update(password, hashed), time.perf_counter() - started
+
+
+def _get_pool() -> Tuple[ProcessPoolExecutor, asyncio.Semaphore]:
+    global _executor, _semaphore
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=PASSWORD_WORKERS)
+        _semaphore = asyncio.Semaphore(PASSWORD_MAX_CONCURRENCY)
+    return _executor, _semaphore
+
+
+async def _run(operation: str, func, *args):
+    executor, semaphore = _get_pool()
+    queued_at = time.perf_counter()
+    stats.waiting += 1
+    try:
+        async with semaphore:
+            result, work_time = await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+    finally:
+        stats.waiting -= 1
+    # Tiempo de cola = total - bcrypt (incluye semáforo, cola del pool y el ida y vuelta al proceso)
+    queue_time = time.perf_counter() - queued_at - work_time
+    stats.operations += 1
+    stats.queue_time_total += queue_time
+    stats.queue_time_max = max(stats.queue_time_max, queue_time)
+    stats.work_time_total += work_time
+    BCRYPT_QUEUE_TIME.labels(operation).observe(queue_time)
+    BCRYPT_DURATION.labels(operation).observe(work_time)
+    return result
+
+
+async def hash_password(password: str) -> str:
+    return await _run("hash", _timed_hash, password)
+
+
+async def verify_and_update_password(password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verifica la contraseña. Si es válida y el hash usa un costo o esquema viejo,
+    devuelve también el hash nuevo para guardarlo (si no, None).
+    """
+    return await _run("verify", _timed_verify_and_update, password, hashed)
+
+
+def shutdown_pool() -> None:
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
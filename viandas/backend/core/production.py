@@ -0,0 +1,94 @@
+# core/production.py
+# Plan de producción de la cocina: cuántas viandas de cada producto preparar para una fecha,
+# según los pedidos solicitados y confirmados.
+#
+# Es un único GROUP BY sobre lineOfSale + sales (los índices parciales de las colas vivas
+# cubren el filtro por estado y fecha), detrás de un cache corto. El cache se vacía con
+# cualquier evento de venta publicado en el broker, así la pantalla de cocina puede
+# refrescar seguido sin costo y sin ver datos viejos.
+
+import asyncio
+import time
+from datetime import date
+from typing import Dict
+
+from sqlalchemy import case, func, select
+
+from config import AsyncSessionLocal
+from core import sale_status
+from core.events import broker, SALES_CHANNEL
+from models.models import LineOfSale, Product, Sale
+
+PRODUCTION_PLAN_TTL_SECONDS = 30
+
+
+async def compute_production_plan(db, target_date: date) -> dict:
+    cantidad_por_estado = lambda estado: func.coalesce(
+        func.sum(case((Sale.status == estado, LineOfSale.cantidad), else_=0)), 0
+    )
+    rows = (await db.execute(
+        select(
+            LineOfSale.product_id,
+            Product.nombre,
+            cantidad_por_estado(sale_status.SOLICITADO).label("solicitados"),
+            cantidad_por_estado(sale_status.CONFIRMADO).label("confirmados"),
+        )
+        .join(Sale, Sale.id == LineOfSale.sale_id)
+        .join(Product, Product.id == LineOfSale.product_id)
+        .where(
+            Sale.date == target_date,
+            Sale.status.in_([sale_status.SOLICITADO, sale_status.CONFIRMADO]),
+        )
+        .group_by(LineOfSale.product_id, Product.nombre)
+        .order_by(Product.nombre)
+    )).all()
+    items = [
+        {
+            "product_id": row.product_id,
+            "nombre": row.nombre,
+            "solicitados": row.solicitados,
+            "confirmados": row.confirmados,
+            "total": row.solicitados + row.confirmados,
+        }
+        for row in rows
+    ]
+    return {"date": target_date, "items": items, "total": sum(item["total"] for item in items)}
+
+
+class ProductionPlanCache:
+    """Plan por fecha con TTL corto; se vacía entero ante cualquier cambio de ventas."""
+
+    def __init__(self, ttl_seconds: float = PRODUCTION_PLAN_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[date, tuple] = {}
+        self._generation = 0
+        self._lock = asyncio.Lock()
+
+    async def get(self, target_date: date) -> dict:
+        entry = self._entries.get(target_date)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+        async with self._lock: # Un solo cálculo aunque refresquen varias pantallas a la vez
+            entry = self._entries.get(target_date)
+            if entry is not None and entry[0] > time.monotonic():
+                return entry[1]
+            generation = self._generation
+            async with AsyncSessionLocal() as db:
+                plan = await compute_production_plan(db, target_date)
+            if generation == self._generation: # No cachear si hubo cambios durante el cálculo
+                self._entries[target_date] = (time.monotonic() + self.ttl_seconds, plan)
+            return plan
+
+    def invalidate(self) -> None:
+        self._generation += 1
+        self._entries.clear()
+
+    async def listen(self) -> None:
+        """Vacía el cache con cada evento de venta (de este proceso o de otros workers)."""
+        async with broker.subscribe(SALES_CHANNEL) as queue:
+            while True:
+                await queue.get()
+                self.invalidate()
+
+
+production_plan_cache = ProductionPlanCache()
@@ -0,0 +1,106 @@
+# core/refresh_tokens.py
+# Refresh tokens opacos con rotación y detección de reuso.
+#
+# Renovar la sesión no pasa por bcrypt: el token se busca por su HMAC-SHA256 (índice único).
+# Cada canje marca el token como usado y emite uno nuevo de la misma familia. Si un token
+# ya usado se vuelve a presentar, alguien lo copió: se revoca toda la familia y ambos
+# (el legítimo y el atacante) tienen que volver a loguearse.
+
+import hashlib
+import hmac
+import os
+import secrets
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import select, update, delete, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.security import SECRET_KEY
+from models.models import RefreshToken
+
+REFRESH_TOKEN_TTL = timedelta(days=int(os.getenv("REFRESH_TOKEN_DAYS", "30")))
+REFRESH_TOKEN_SECRET = os.getenv("REFRESH_TOKEN_SECRET", SECRET_KEY).encode()
+
+
+def _digest(token: str) -> str:
+    return hmac.new(REFRESH_TOKEN_SECRET, token.encode(), hashlib.sha256).hexdigest()
+
+
+def _invalid_token() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Refresh token inválido o vencido",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+def issue(db: AsyncSession, user_id: int, family_id: Optional[str] = None) -> str:
+    """Agrega a la sesión un refresh token nuevo (familia nueva si no se indica) y devuelve el token en claro."""
+    token = secrets.token_urlsafe(32)
+    db.add(RefreshToken(
+        token_hash=_digest(token),
+        family_id=family_id or uuid.uuid4().hex,
+        user_id=user_id,
+        expires_at=datetime.now(timezone.utc) + REFRESH_TOKEN_TTL,
+    ))
+    return token
+
+
+async def revoke_family(db: AsyncSession, family_id: str) -> None:
+    await db.execute(
+        update(RefreshToken)
+        .where(RefreshToken.family_id == family_id, RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=func.now())
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def rotate(db: AsyncSession, token: str) -> Tuple[int, str]:
+    """
+    Canjea `token` por uno nuevo de la misma familia. Devuelve (user_id, token nuevo).
+    El canje es un UPDATE condicional: dos canjes simultáneos del mismo token no pueden ganar ambos.
+    Ante un reuso revoca la familia (y commitea) antes de responder 401.
+    """
+    digest = _digest(token)
+    row = (await db.execute(
+        update(RefreshToken)
+        .where(
+            RefreshToken.token_hash == digest,
+            RefreshToken.used_at.is_(None),
+            RefreshToken.revoked_at.is_(None),
+            RefreshToken.expires_at > func.now(),
+        )
+        .values(used_at=func.now())
+        .returning(RefreshToken.user_id, RefreshToken.family_id)
+        .execution_options(synchronize_session=False)
+    )).first()
+
+    if row is None:
+        existing = (await db.execute(
+            select(RefreshToken.family_id, RefreshToken.used_at).where(RefreshToken.token_hash == digest)
+        )).first()
+        if existing is not None and existing.used_at is not None:
+            print(f"Reuso de refresh token detectado, familia {existing.family_id} revocada")
+            await revoke_family(db, existing.family_id)
+            await db.commit()
+        raise _invalid_token()
+
+    return row.user_id, issue(db, row.user_id, row.family_id)
+
+
+async def revoke(db: AsyncSession, token: str) -> None:
+    """Logout: revoca la familia del token, si existe."""
+    family_id = (await db.execute(
+        select(RefreshToken.family_id).where(RefreshToken.token_hash == _digest(token))
+    )).scalar()
+    if family_id is not None:
+        await revoke_family(db, family_id)
+
+
+async def purge_expired_refresh_tokens(db: AsyncSession) -> int:
+    """Borra los refresh tokens vencidos. Pensado para correr periódicamente."""
+    result = await db.execute(delete(RefreshToken).where(RefreshToken.expires_at < func.now()))
+    return result.rowcount
@@ -0,0 +1,212 @@
+# core/reservations.py
+# Reservas de stock para pedidos online.
+#
+# Un pedido online reserva su cantidad al crearse (Product.reserved) y la
+# reserva se consume al registrar el retiro en caja. Cada operación sobre Product es
+# un único UPDATE condicional y atómico para todos los productos del pedido
+# (update-where-available-returning); el orden de los locks lo fija una subquery
+# FOR UPDATE dentro del mismo UPDATE, sin un SELECT previo.
+
+from collections import defaultdict
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, NamedTuple
+
+from sqlalchemy import Integer, column, func, insert, select, update, values
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.models import Product, StockReservation
+from core.catalog import record_stock_change
+from core.low_stock import is_low, record_crossing
+from core.metrics import STOCK_LOCK_WAIT
+
+# Tiempo que un pedido solicitado (sin confirmar) retiene el stock
+RESERVA_TTL_SOLICITADO = timedelta(hours=4)
+# Tiempo que un pedido confirmado retiene el stock hasta el retiro
+RESERVA_TTL_CONFIRMADO = timedelta(hours=24)
+
+
+class StockNoDisponible(Exception):
+    """El producto no existe, está inactivo o no tiene stock disponible suficiente."""
+
+    def __init__(self, product_id: int, cantidad: int):
+        super().__init__(f"Stock no disponible para el producto {product_id}")
+        self.product_id = product_id
+        self.cantidad = cantidad
+
+
+def sum_quantities(lines: Iterable) -> Dict[int, int]:
+    """Agrupa cantidades por product_id. Acepta cualquier objeto con product_id y cantidad."""
+    quantities = defaultdict(int)
+    for line in lines:
+        quantities[line.product_id] += line.cantidad
+    return dict(quantities)
+
+
+class StockChange(NamedTuple):
+    """Cambio sobre un producto dentro del UPDATE por lotes de _apply_stock_updates."""
+    cantidad: int # Lo que tiene que estar disponible
+    stock_delta: int = 0
+    reserved_delta: int = 0
+    extra_available: int = 0 # Lo que el propio pedido ya tenía reservado
+
+
+async def _apply_stock_updates(db: AsyncSession, changes: Dict[int, StockChange], operation: str = "stock") -> Dict[int, float]:
+    """
+    Aplica `changes` ({product_id: StockChange}) en un único UPDATE ... FROM (VALUES ...)
+    condicional: sólo se actualizan productos activos con stock - reservado + extra_available
+    >= cantidad. Las filas se bloquean en orden de id (subquery FOR UPDATE) para que dos
+    pedidos con los mismos productos no se bloqueen mutuamente.
+    `operation` etiqueta la métrica de duración (incluye la espera por los locks).
+    Devuelve {product_id: precioActual} o lanza StockNoDisponible con el primer producto
+    (por id) que no se pudo actualizar; el llamador hace rollback de la transacción.
+    """
+    if not changes:
+        return {}
+    ids = sorted(changes)
+    requested = values(
+        column("product_id", Integer), column("cantidad", Integer), column("stock_delta", Integer),
+        column("reserved_delta", Integer), column("extra_available", Integer),
+        name="requested",
+    ).data([(product_id, *changes[product_id]) for product_id in ids])
+    # Alias: una subquery sobre `products` sin alias se correlacionaría con la tabla del UPDATE
+    locked = Product.__table__.alias("locked")
+    lock_in_order = select(locked.c.id).where(locked.c.id.in_(ids)).order_by(locked.c.id).with_for_update()
+
+    started = time.perf_counter()
+    rows = (await db.execute(
+        update(Product)
+        .where(
+            Product.id == requested.c.product_id,
+            Product.id.in_(lock_in_order),
+            Product.is_active == True,
+            Product.stock - Product.reserved + requested.c.extra_available >= requested.c.cantidad,
+        )
+        .values(stock=Product.stock + requested.c.stock_delta, reserved=Product.reserved + requested.c.reserved_delta)
+        .returning(Product.id, Product.precioActual, Product.stock, Product.reserved, Product.change_seq, Product.stockMinimo)
+        .execution_options(synchronize_session=False)
+    )).all()
+    STOCK_LOCK_WAIT.labels(operation).observe(time.perf_counter() - started)
+
+    updated = {row.id for row in rows}
+    missing = [product_id for product_id in ids if product_id not in updated]
+    if missing:
+        raise StockNoDisponible(missing[0], changes[missing[0]].cantidad)
+
+    prices = {}
+    for row in rows:
+        record_stock_change(db, row) # Para actualizar el catálogo en memoria tras el commit
+        stock_delta = changes[row.id].stock_delta
+        if stock_delta:
+            # El UPDATE bloquea la fila: stock - stock_delta es exactamente el valor anterior
+            record_crossing(db, row.id, is_low(row.stock - stock_delta, row.stockMinimo), row.stock, row.stockMinimo)
+        prices[row.id] = row.precioActual
+    return prices
+
+
+async def reserve_stock(db: AsyncSession, sale_id: int, quantities: Dict[int, int], ttl: timedelta = RESERVA_TTL_SOLICITADO) -> Dict[int, float]:
+    """
+    Reserva `quantities` ({product_id: cantidad}) para la venta y registra la reserva en el ledger.
+    Los productos se actualizan en orden de id para evitar deadlocks entre pedidos concurrentes.
+    Devuelve {product_id: precioActual}.
+    """
+    prices = await _apply_stock_updates(db, {
+        product_id: StockChange(cantidad, reserved_delta=cantidad) for product_id, cantidad in quantities.items()
+    }, operation="reserva")
+
+    if quantities:
+        expires_at = datetime.now(timezone.utc) + ttl
+        await db.execute(insert(StockReservation), [
+            dict(
+                sale_id=sale_id,
+                product_id=product_id,
+                cantidad=cantidad,
+                status="activa",
+                expires_at=expires_at,
+            )
+            for product_id, cantidad in sorted(quantities.items())
+        ])
+    return prices
+
+
+async def decrement_stock(db: AsyncSession, quantities: Dict[int, int]) -> Dict[int, float]:
+    """
+    Descuenta stock de una venta directa (sin reserva previa), respetando lo reservado
+    por otros pedidos. Devuelve {product_id: precioActual}.
+    """
+    return await _apply_stock_updates(db, {
+        product_id: StockChange(cantidad, stock_delta=-cantidad) for product_id, cantidad in quantities.items()
+    }, operation="venta_caja")
+
+
+async def _claim_active(db: AsyncSession, sale_id: int, new_status: str) -> Dict[int, int]:
+    """Pasa las reservas activas de la venta a `new_status` y devuelve lo reservado por producto."""
+    rows = (await db.execute(
+        update(StockReservation)
+        .where(StockReservation.sale_id == sale_id, StockReservation.status == "activa")
+        .values(status=new_status)
+        .returning(StockReservation.product_id, StockReservation.cantidad)
+        .execution_options(synchronize_session=False)
+    )).all()
+    return sum_quantities(rows)
+
+
+async def renew_reservations(db: AsyncSession, sale_id: int, quantities: Dict[int, int], ttl: timedelta = RESERVA_TTL_CONFIRMADO) -> None:
+    """
+    Extiende las reservas activas de la venta y reserva de nuevo lo que falte
+    (por ejemplo, si la reserva original venció antes de la confirmación).
+    """
+    rows = (await db.execute(
+        update(StockReservation)
+        .where(StockReservation.sale_id == sale_id, StockReservation.status == "activa")
+        .values(expires_at=func.now() + ttl)
+        .returning(StockReservation.product_id, StockReservation.cantidad)
+        .execution_options(synchronize_session=False)
+    )).all()
+    covered = sum_quantities(rows)
+    missing = {
+        product_id: cantidad - covered.get(product_id, 0)
+        for product_id, cantidad in quantities.items()
+        if cantidad > covered.get(product_id, 0)
+    }
+    await reserve_stock(db, sale_id, missing, ttl)
+
+
+async def consume_reservations(db: AsyncSession, sale_id: int, quantities: Dict[int, int]) -> None:
+    """
+    Descuenta el stock de un pedido al retirarse, liberando su reserva en el mismo UPDATE.
+    Si la reserva ya no está activa (pedido previo al ledger o reserva vencida) se valida
+    contra el stock disponible como en una venta directa.
+    """
+    reserved = await _claim_active(db, sale_id, "consumida")
+    changes = {}
+    for product_id, cantidad in quantities.items():
+        covered = min(reserved.get(product_id, 0), cantidad)
+        changes[product_id] = StockChange(cantidad, stock_delta=-cantidad, reserved_delta=-covered, extra_available=covered)
+    await _apply_stock_updates(db, changes, operation="retiro")
+
+
+async def release_expired_reservations(db: AsyncSession) -> int:
+    """
+    Libera las reservas activas vencidas y devuelve su cantidad al disponible.
+    El cambio de estado se hace con un UPDATE condicional, así una reserva nunca
+    se libera y se consume a la vez.
+    """
+    rows = (await db.execute(
+        update(StockReservation)
+        .where(StockReservation.status == "activa", StockReservation.expires_at < func.now())
+        .values(status="liberada")
+        .returning(StockReservation.product_id, StockReservation.cantidad)
+        .execution_options(synchronize_session=False)
+    )).all()
+    released = sum_quantities(rows)
+    for product_id in sorted(released):
+        row = (await db.execute(
+            update(Product)
+            .where(Product.id == product_id)
+            .values(reserved=Product.reserved - released[product_id])
+            .returning(Product.id, Product.stock, Product.reserved, Product.change_seq)
+            .execution_options(synchronize_session=False)
+        )).first()
+        record_stock_change(db, row)
+    return len(rows)
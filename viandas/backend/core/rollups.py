@@ -0,0 +1,81 @@
+# core/rollups.py
+# Rollup diario de ventas registradas: fecha x producto x medio de pago -> unidades, recaudación, ventas.
+#
+# Se actualiza en la misma transacción que registra la venta (venta en caja o retiro de un
+# pedido online), con un upsert que suma sobre la fila existente. Así los reportes leen
+# unas pocas filas en lugar de recorrer ventas y líneas.
+# La fecha es Sale.date, igual que en /sales/ventas.
+
+from collections import defaultdict
+from datetime import date
+from typing import Iterable, Optional
+
+from sqlalchemy import func, select, delete, literal
+from sqlalchemy.dialects.postgresql import insert
+
+from models.models import DailySalesRollup, Sale, LineOfSale
+
+
+def rollup_rows(sale_date: date, medio_pago: Optional[str], lines: Iterable) -> list:
+    """Agrupa las líneas de una venta ({product_id, cantidad, precio}) en filas del rollup."""
+    units = defaultdict(int)
+    revenue = defaultdict(float)
+    for line in lines:
+        product_id, cantidad, precio = (
+            (line["product_id"], line["cantidad"], line["precio"]) if isinstance(line, dict)
+            else (line.product_id, line.cantidad, line.precio)
+        )
+        units[product_id] += cantidad
+        revenue[product_id] += cantidad * precio
+    return [
+        dict(date=sale_date, product_id=product_id, medioPago=medio_pago or "",
+             units=units[product_id], revenue=revenue[product_id], sales_count=1)
+        for product_id in sorted(units) # Orden fijo de filas bloqueadas entre transacciones
+    ]
+
+
+async def add_sale_to_rollup(db, sale_date: date, medio_pago: Optional[str], lines: Iterable) -> None:
+    """Suma una venta registrada al rollup. Llamar dentro de la transacción de la venta."""
+    rows = rollup_rows(sale_date, medio_pago, lines)
+    if not rows:
+        return
+    stmt = insert(DailySalesRollup).values(rows)
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=[DailySalesRollup.date, DailySalesRollup.product_id, DailySalesRollup.medioPago],
+        set_={
+            "units": DailySalesRollup.units + stmt.excluded.units,
+            "revenue": DailySalesRollup.revenue + stmt.excluded.revenue,
+            "sales_count": DailySalesRollup.sales_count + stmt.excluded.sales_count,
+        },
+    ))
+
+
+def rebuild_statements(from_date: Optional[date] = None, to_date: Optional[date] = None):
+    """
+    (DELETE, INSERT ... SELECT) que recalculan el rollup desde ventas y líneas para el rango.
+    Se ejecutan juntos en una transacción (scripts/rebuild_sales_rollup.py).
+    """
+    delete_stmt = delete(DailySalesRollup)
+    source = (
+        select(
+            Sale.date,
+            LineOfSale.product_id,
+            func.coalesce(Sale.medioPago, literal("")).label("medioPago"),
+            func.sum(LineOfSale.cantidad).label("units"),
+            func.sum(LineOfSale.cantidad * LineOfSale.precio).label("revenue"),
+            func.count(func.distinct(Sale.id)).label("sales_count"),
+        )
+        .join(LineOfSale, LineOfSale.sale_id == Sale.id)
+        .where(Sale.sale_in_register == True)
+        .group_by(Sale.date, LineOfSale.product_id, func.coalesce(Sale.medioPago, literal("")))
+    )
+    if from_date:
+        delete_stmt = delete_stmt.where(DailySalesRollup.date >= from_date)
+        source = source.where(Sale.date >= from_date)
+    if to_date:
+        delete_stmt = delete_stmt.where(DailySalesRollup.date <= to_date)
+        source = source.where(Sale.date <= to_date)
+    insert_stmt = insert(DailySalesRollup).from_select(
+        ["date", "product_id", "medioPago", "units", "revenue", "sales_count"], source
+    )
+    return delete_stmt, insert_stmt
@@ -0,0 +1,45 @@
+# core/sale_status.py
+# Estado explícito del flujo de una venta (columna Sale.status).
+#
+# Los booleanos order_confirmed / sale_in_register / pagado se siguen manteniendo
+# (el frontend los usa), pero las colas filtran por `status`, que tiene índices
+# parciales sobre los estados vivos. Toda transición pasa por estos helpers para
+# que las cuatro columnas no se desincronicen.
+
+SOLICITADO = "solicitado"   # Pedido online sin confirmar
+CONFIRMADO = "confirmado"   # Confirmado, listo para retirar
+REGISTRADO = "registrado"   # Retirado / registrado en caja, sin pagar
+FINALIZADO = "finalizado"   # Registrado y pagado
+
+ESTADOS = (SOLICITADO, CONFIRMADO, REGISTRADO, FINALIZADO)
+ESTADOS_VIVOS = (SOLICITADO, CONFIRMADO)
+
+
+def status_for(order_confirmed: bool, sale_in_register: bool, pagado: bool) -> str:
+    if sale_in_register:
+        return FINALIZADO if pagado else REGISTRADO
+    return CONFIRMADO if order_confirmed else SOLICITADO
+
+
+def _sync(sale) -> None:
+    sale.status = status_for(bool(sale.order_confirmed), bool(sale.sale_in_register), bool(sale.pagado))
+
+
+def mark_confirmed(sale) -> None:
+    """solicitado -> confirmado (confirm_sale_admin)."""
+    sale.order_confirmed = True
+    _sync(sale)
+
+
+def mark_registered(sale) -> None:
+    """confirmado -> registrado/finalizado (register_sale_in_caja_admin)."""
+    if not sale.order_confirmed:
+        raise ValueError(f"La venta {sale.id} debe estar confirmada antes de registrarse.")
+    sale.sale_in_register = True
+    _sync(sale)
+
+
+def mark_paid(sale) -> None:
+    """Marca el pago (set_pagado). Una venta registrada pasa a finalizada."""
+    sale.pagado = True
+    _sync(sale)
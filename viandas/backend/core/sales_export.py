@@ -0,0 +1,86 @@
+# core/sales_export.py
+# Exportación de ventas en streaming (CSV o NDJSON), una fila por línea de venta.
+#
+# Las filas se leen con un cursor server-side (yield_per) y se escriben por tandas,
+# así la memoria usada no depende del rango de fechas exportado.
+
+import csv
+import io
+import json
+from datetime import date
+from typing import AsyncIterator, Optional
+
+from sqlalchemy import select
+
+from config import AsyncSessionLocal
+from models.models import Sale, LineOfSale, Product, User
+
+EXPORT_BATCH_SIZE = 1000
+
+EXPORT_COLUMNS = [
+    "sale_id", "date", "medioPago", "pagado", "order_confirmed", "sale_in_register",
+    "observation", "user_id", "user_email", "numeroDeLinea", "product_id",
+    "product_nombre", "cantidad", "precio", "subtotal",
+]
+
+
+def build_export_query(from_date: Optional[date], to_date: Optional[date], registered_only: bool):
+    """SELECT plano (sin entidades ORM) de ventas + líneas + producto + cliente."""
+    stmt = (
+        select(
+            Sale.id.label("sale_id"),
+            Sale.date,
+            Sale.medioPago,
+            Sale.pagado,
+            Sale.order_confirmed,
+            Sale.sale_in_register,
+            Sale.observation,
+            Sale.user_id,
+            User.email.label("user_email"),
+            LineOfSale.numeroDeLinea,
+            LineOfSale.product_id,
+            Product.nombre.label("product_nombre"),
+            LineOfSale.cantidad,
+            LineOfSale.precio,
+            (LineOfSale.cantidad * LineOfSale.precio).label("subtotal"),
+        )
+        .join(LineOfSale, LineOfSale.sale_id == Sale.id)
+        .join(Product, Product.id == LineOfSale.product_id)
+        .outerjoin(User, User.id == Sale.user_id)
+    )
+    if registered_only:
+        stmt = stmt.where(Sale.sale_in_register == True)
+    if from_date:
+        stmt = stmt.where(Sale.date >= from_date)
+    if to_date:
+        stmt = stmt.where(Sale.date <= to_date)
+    return stmt.order_by(Sale.date, Sale.id, LineOfSale.numeroDeLinea).execution_options(yield_per=EXPORT_BATCH_SIZE)
+
+
+async def _stream_partitions(stmt):
+    # La sesión vive dentro del generador: el streaming sigue después de que el endpoint retornó
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(stmt)
+        async for partition in result.partitions(EXPORT_BATCH_SIZE):
+            yield partition
+
+
+async def stream_csv(stmt) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    async for partition in _stream_partitions(stmt):
+        writer.writerows(partition)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+async def stream_ndjson(stmt) -> AsyncIterator[str]:
+    async for partition in _stream_partitions(stmt):
+        yield "".join(
+            json.dumps(dict(row._mapping), default=str, ensure_ascii=False) + "\n"
+            for row in partition
+        )
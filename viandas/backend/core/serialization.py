@@ -0,0 +1,113 @@
+# core/serialization.py
+# Serialización rápida para listados grandes de ventas.
+#
+# El camino normal de FastAPI valida cada venta ORM contra SaleAdminView (from_attributes)
+# y después codifica con json de la stdlib. Para datos que salen de nuestra propia base
+# eso es trabajo repetido: acá se arman los dicts directamente desde los objetos ORM
+# (los campos salen de los schemas, así no se desincronizan) y se codifican con orjson.
+
+import json
+from operator import attrgetter
+from typing import Any, Dict, Iterable, List, Optional
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from schemas.schemas import (
+    SaleAdminView, SaleCompact, LineOfSaleFull, LineOfSaleCompact,
+    Product as ProductSchema, User as UserSchema,
+)
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional: sin él se usa el encoder de la stdlib
+    orjson = None
+
+# Validador precompilado para cuando los datos NO son de confianza (p.ej. tests o datos externos)
+SALE_LIST_ADAPTER = TypeAdapter(List[SaleAdminView])
+
+
+def _fields(schema, *exclude) -> List[str]:
+    return [name for name in schema.model_fields if name not in exclude]
+
+
+_USER_FIELDS = _fields(UserSchema)
+_PRODUCT_FIELDS = _fields(ProductSchema)
+_SALE_FIELDS = _fields(SaleAdminView, "user", "line_of_sales")
+_LINE_FIELDS = _fields(LineOfSaleFull, "product")
+_SALE_COMPACT_FIELDS = _fields(SaleCompact, "line_of_sales")
+_LINE_COMPACT_FIELDS = _fields(LineOfSaleCompact)
+
+_get_user = attrgetter(*_USER_FIELDS)
+_get_product = attrgetter(*_PRODUCT_FIELDS)
+_get_sale = attrgetter(*_SALE_FIELDS)
+_get_line = attrgetter(*_LINE_FIELDS)
+_get_sale_compact = attrgetter(*_SALE_COMPACT_FIELDS)
+_get_line_compact = attrgetter(*_LINE_COMPACT_FIELDS)
+
+
+def user_dict(user) -> Optional[Dict[str, Any]]:
+    if user is None:
+        return None
+    return dict(zip(_USER_FIELDS, _get_user(user)))
+
+
+def product_dict(product) -> Dict[str, Any]:
+    data = dict(zip(_PRODUCT_FIELDS, _get_product(product)))
+    data["available"] = data["stock"] - data["reserved"] # computed_field de schemas.Product
+    return data
+
+
+def sales_to_rows(sales: Iterable) -> List[Dict[str, Any]]:
+    """Equivalente a SaleAdminView para cada venta, sin validación. Cada producto/usuario se arma una vez."""
+    products: Dict[int, Dict[str, Any]] = {}
+    users: Dict[int, Optional[Dict[str, Any]]] = {}
+    rows = []
+    for sale in sales:
+        row = dict(zip(_SALE_FIELDS, _get_sale(sale)))
+        if sale.user_id not in users:
+            users[sale.user_id] = user_dict(sale.user)
+        row["user"] = users[sale.user_id]
+        lines = []
+        for line in sale.line_of_sales:
+            line_row = dict(zip(_LINE_FIELDS, _get_line(line)))
+            product = products.get(line.product_id)
+            if product is None:
+                product = products[line.product_id] = product_dict(line.product)
+            line_row["product"] = product
+            lines.append(line_row)
+        row["line_of_sales"] = lines
+        rows.append(row)
+    return rows
+
+
+def sales_to_compact(sales: Iterable, next_cursor: Optional[str]) -> Dict[str, Any]:
+    """Equivalente a SalesCompactPage, sin validación."""
+    products: Dict[int, Dict[str, Any]] = {}
+    users: Dict[int, Dict[str, Any]] = {}
+    compact = []
+    for sale in sales:
+        row = dict(zip(_SALE_COMPACT_FIELDS, _get_sale_compact(sale)))
+        row["line_of_sales"] = [dict(zip(_LINE_COMPACT_FIELDS, _get_line_compact(line))) for line in sale.line_of_sales]
+        compact.append(row)
+        if sale.user is not None and sale.user_id not in users:
+            users[sale.user_id] = user_dict(sale.user)
+        for line in sale.line_of_sales:
+            if line.product_id not in products:
+                products[line.product_id] = product_dict(line.product)
+    return {"sales": compact, "products": products, "users": users, "next_cursor": next_cursor}
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        # OPT_NON_STR_KEYS: los diccionarios de la vista compacta usan ids enteros como clave
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(jsonable_encoder(content), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse que codifica con orjson (o la stdlib si no está instalado)."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,110 @@
+# core/sql_profiler.py
+# Perfilado de SQL por request: cantidad de queries, tiempo en la base, sospechas de N+1
+# y queries lentas.
+#
+# Los eventos del engine (sync y async.sync_engine) suman en el perfil de la request actual,
+# que viaja en un ContextVar. Sólo se perfila una fracción de las requests
+# (SQL_PROFILE_SAMPLE_RATE); en las demás el costo es leer el ContextVar.
+# - N+1: la misma sentencia (mismo SQL, distintos parámetros) ejecutada N_PLUS_ONE_THRESHOLD
+#   veces o más en una request. Suele ser un lazy load que se escapó de un selectinload.
+# - Queries lentas: se loguea la sentencia, se perfile o no la request. Los parámetros
+#   (hashes de contraseñas y de refresh tokens, datos de usuarios) sólo con SQL_LOG_PARAMETERS=true.
+# - Con SQL_PROFILE_HEADERS=true las respuestas perfiladas llevan X-DB-Query-Count y X-DB-Time.
+
+import logging
+import os
+import random
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+
+SAMPLE_RATE = float(os.getenv("SQL_PROFILE_SAMPLE_RATE", "0.1"))
+EXPOSE_HEADERS = os.getenv("SQL_PROFILE_HEADERS", "false").lower() in ("1", "true", "yes")
+SLOW_QUERY_MS = float(os.getenv("SQL_SLOW_QUERY_MS", "200"))
+N_PLUS_ONE_THRESHOLD = int(os.getenv("SQL_N_PLUS_ONE_THRESHOLD", "5"))
+LOG_PARAMETERS = os.getenv("SQL_LOG_PARAMETERS", "false").lower() in ("1", "true", "yes") # Sólo para depurar
+MAX_LOGGED_CHARS = 500
+
+logger = logging.getLogger(__name__)
+
+
+class QueryProfile:
+    __slots__ = ("count", "total_time", "statements")
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.statements = Counter()
+
+
+_current_profile: ContextVar[Optional[QueryProfile]] = ContextVar("sql_profile", default=None)
+
+
+def _truncate(value) -> str:
+    text = str(value)
+    return text if len(text) <= MAX_LOGGED_CHARS else text[:MAX_LOGGED_CHARS] + "..."
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        logger.warning("Query lenta (%.0f ms): %s", elapsed * 1000, _truncate(statement))
+        if LOG_PARAMETERS:
+            logger.warning("Parámetros de la query lenta: %s", _truncate(parameters))
+    profile = _current_profile.get()
+    if profile is None:
+        return
+    profile.count += 1
+    profile.total_time += elapsed
+    profile.statements[statement] += 1
+
+
+def install_sql_profiler(*engines) -> None:
+    """Registra los eventos en los engines (para async, pasar async_engine.sync_engine)."""
+    for engine in engines:
+        if engine is None:
+            continue
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class SQLProfilerMiddleware:
+    def __init__(self, app, sample_rate: float = SAMPLE_RATE, expose_headers: bool = EXPOSE_HEADERS):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.expose_headers = expose_headers
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or random.random() >= self.sample_rate:
+            await self.app(scope, receive, send)
+            return
+
+        profile = QueryProfile()
+        token = _current_profile.set(profile)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and self.expose_headers:
+                # Lo ejecutado hasta que empieza la respuesta (en streams, las queries siguientes no cuentan)
+                headers = MutableHeaders(raw=message["headers"])
+                headers["X-DB-Query-Count"] = str(profile.count)
+                headers["X-DB-Time"] = f"{profile.total_time * 1000:.1f}"
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_profile.reset(token)
+            self._report(scope, profile)
+
+    def _report(self, scope, profile: QueryProfile) -> None:
+        for statement, times in profile.statements.items():
+            if times >= N_PLUS_ONE_THRESHOLD:
+                logger.warning("Posible N+1 en %s %s: %dx %s", scope["method"], scope["path"], times, _truncate(statement))
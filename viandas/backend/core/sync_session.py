@@ -0,0 +1,90 @@
+# core/sync_session.py
+# Adaptador con la misma API que AsyncSession sobre una Session sync.
+# Permite que los routers async corran sobre el engine sync (USE_ASYNC_DB=false):
+# cada operación que toca la base se ejecuta en el threadpool y nunca bloquea el event loop.
+
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+
+
+class _StreamedResult:
+    """Equivalente mínimo de AsyncResult: entrega el resultado por particiones sin bloquear el loop."""
+
+    def __init__(self, result):
+        self._result = result
+
+    async def partitions(self, size=None):
+        partitions = self._result.partitions(size)
+        while True:
+            chunk = await run_in_threadpool(next, partitions, None)
+            if chunk is None:
+                break
+            yield chunk
+
+
+class SyncSessionAdapter:
+    """Subconjunto de AsyncSession usado por los routers, implementado sobre Session."""
+
+    def __init__(self, session: Session):
+        self.sync_session = session
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    # --- Operaciones en memoria (no hacen I/O) ---
+    @property
+    def info(self) -> dict:
+        return self.sync_session.info
+
+    def add(self, instance) -> None:
+        self.sync_session.add(instance)
+
+    def add_all(self, instances) -> None:
+        self.sync_session.add_all(instances)
+
+    def expunge_all(self) -> None:
+        self.sync_session.expunge_all()
+
+    # --- Operaciones que hablan con la base ---
+    async def execute(self, statement, params=None, **kwargs):
+        # Los cursores de psycopg2 traen el resultado completo en execute(),
+        # así que el Result se puede consumir luego desde el event loop.
+        return await run_in_threadpool(self.sync_session.execute, statement, params, **kwargs)
+
+    async def stream(self, statement, params=None, **kwargs):
+        # Con yield_per el engine sync usa un cursor server-side; se lee de a particiones
+        result = await run_in_threadpool(self.sync_session.execute, statement, params, **kwargs)
+        return _StreamedResult(result)
+
+    async def scalar(self, statement, params=None, **kwargs):
+        return await run_in_threadpool(self.sync_session.scalar, statement, params, **kwargs)
+
+    async def scalars(self, statement, params=None, **kwargs):
+        return await run_in_threadpool(self.sync_session.scalars, statement, params, **kwargs)
+
+    async def get(self, entity, ident, **kwargs):
+        return await run_in_threadpool(self.sync_session.get, entity, ident, **kwargs)
+
+    async def delete(self, instance) -> None:
+        await run_in_threadpool(self.sync_session.delete, instance)
+
+    async def flush(self, objects=None) -> None:
+        await run_in_threadpool(self.sync_session.flush, objects)
+
+    async def refresh(self, instance, attribute_names=None) -> None:
+        await run_in_threadpool(self.sync_session.refresh, instance, attribute_names)
+
+    async def commit(self) -> None:
+        await run_in_threadpool(self.sync_session.commit)
+
+    async def rollback(self) -> None:
+        await run_in_threadpool(self.sync_session.rollback)
+
+    async def close(self) -> None:
+        await run_in_threadpool(self.sync_session.close)
+
+    async def run_sync(self, fn, *args, **kwargs):
+        return await run_in_threadpool(fn, self.sync_session, *args, **kwargs)
@@ -0,0 +1,43 @@
+# core/tasks.py
+# Tareas periódicas de mantenimiento que corren dentro del proceso de la API.
+
+import asyncio
+from typing import Awaitable, Callable, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import AsyncSessionLocal
+
+
+async def _run_job(job: Callable[[AsyncSession], Awaitable[int]], after_commit: Optional[Callable[[AsyncSession], Awaitable[None]]]) -> int:
+    async with AsyncSessionLocal() as db:
+        try:
+            affected = await job(db)
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+        if after_commit is not None:
+            await after_commit(db)
+        return affected
+
+
+async def run_periodically(
+    job: Callable[[AsyncSession], Awaitable[int]],
+    interval_seconds: float,
+    descripcion: str,
+    after_commit: Optional[Callable[[AsyncSession], Awaitable[None]]] = None,
+):
+    """
+    Ejecuta `job(db)` cada `interval_seconds` con su propia sesión y commit.
+    `job` devuelve la cantidad de filas afectadas, que se loguea si es distinta de cero.
+    `after_commit(db)` corre después de un commit exitoso (p.ej. publicar cambios).
+    """
+    while True:
+        try:
+            affected = await _run_job(job, after_commit)
+            if affected:
+                print(f"{descripcion}: {affected}")
+        except Exception as e:
+            print(f"Error en tarea periódica '{descripcion}': {e}")
+        await asyncio.sleep(interval_seconds)
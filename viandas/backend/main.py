@@ -1,12 +1,23 @@
 # main.py
-from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles # ¡Importar!
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
-from config import engine
+from core.compression import CompressionMiddleware
+from core.metrics import MetricsMiddleware, render_metrics, prometheus_client
+from core.sql_profiler import SQLProfilerMiddleware, install_sql_profiler
+from config import engine, async_engine
 from models.models import Base # Importar Base en lugar de modelos específicos si usas metadata
-from routes import auth, users, sales, products, admin, lines
-import os # ¡Importar os!
-from pathlib import Path # ¡Importar Path!
+from routes import auth, users, sales, products, admin, lines, reports
+from core.reservations import release_expired_reservations
+from core.idempotency import purge_expired_keys
+from core.tasks import run_periodically
+from core.events import broker
+from core.catalog import catalog, publish_stock_changes
+from core.identity import identity_cache
+from core.production import production_plan_cache
+from core.passwords import shutdown_pool
+from core.refresh_tokens import purge_expired_refresh_tokens
+from core.images import ImmutableStaticFiles, STATIC_DIR, PRODUCT_IMAGE_DIR, shutdown_executor
+import asyncio
 
 # Crear las tablas si no existen (usando Base.metadata)
 Base.metadata.create_all(bind=engine)
@@ -18,16 +29,14 @@ app = FastAPI(
 )
 
 # --- CONFIGURACIÓN ARCHIVOS ESTÁTICOS ---
-# Define el directorio donde se guardarán las imágenes
-STATIC_DIR = Path("static")
-PRODUCT_IMAGE_DIR = STATIC_DIR / "product_images"
-
+# Los directorios se definen en core/images.py (subida de imágenes de productos)
 # Crear directorios si no existen
 PRODUCT_IMAGE_DIR.mkdir(parents=True, exist_ok=True)
 
 # Montar el directorio estático para que sea accesible desde la URL /static
 # IMPORTANTE: Montar ANTES de incluir los routers si estos dependen de este path
-app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
+# Los nombres con hash de contenido se sirven con cache inmutable
+app.mount("/static", ImmutableStaticFiles(directory=STATIC_DIR), name="static")
 # -----------------------------------------
 
 
@@ -36,9 +45,30 @@ app.add_middleware(
     allow_origins=["http://localhost:3000"],
     allow_credentials = True,
     allow_methods=["*"],
-    allow_headers = ["*"]
+    allow_headers = ["*"],
+    expose_headers = ["X-Next-Cursor", "X-Next-Since", "X-DB-Query-Count", "X-DB-Time"] # Cursores y perfilado de SQL
 )
 
+# Compresión brotli/gzip de las respuestas grandes (listados de ventas, catálogo)
+app.add_middleware(CompressionMiddleware)
+
+# Perfilado de SQL por request con muestreo (core/sql_profiler.py)
+install_sql_profiler(engine, async_engine.sync_engine if async_engine is not None else None)
+app.add_middleware(SQLProfilerMiddleware)
+
+# Latencia por ruta y requests en vuelo (core/metrics.py). Se agrega último para que
+# envuelva a los demás middlewares y mida la request completa.
+app.add_middleware(MetricsMiddleware, fastapi_app=app)
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    """Métricas en formato Prometheus (agrega todos los workers con PROMETHEUS_MULTIPROC_DIR)."""
+    if prometheus_client is None:
+        return Response("prometheus_client no está instalado", status_code=503, media_type="text/plain")
+    body, content_type = render_metrics()
+    return Response(body, media_type=content_type)
+
 
 # Incluir los routers
 tags_metadata = [
@@ -48,6 +78,7 @@ tags_metadata = [
     {"name": "products", "description": "Gestión de productos"},
     {"name": "admin", "description": "Operaciones administrativas"},
     {"name": "lines", "description": "Gestión de lineas de venta"},
+    {"name": "reports", "description": "Reportes de ventas (rollup diario)"},
 ]
 
 app.include_router(auth.router, prefix="/auth", tags=["auth"])
@@ -55,4 +86,37 @@ app.include_router(users.router, prefix="/users", tags=["users"])
 app.include_router(sales.router, prefix="/sales", tags=["sales"])
 app.include_router(products.router, prefix="/products", tags=["products"])
 app.include_router(admin.router, prefix="/admin", tags=["admin"])
-app.include_router(lines.router, prefix="/lines", tags=["lines"])
\ No newline at end of file
+app.include_router(lines.router, prefix="/lines", tags=["lines"])
+app.include_router(reports.router, prefix="/reports", tags=["reports"])
+
+
+# --- TAREAS DE FONDO ---
+@app.on_event("startup")
+async def start_background_tasks():
+    await broker.start() # Broker de eventos de ventas (memoria o LISTEN/NOTIFY)
+    app.state.background_tasks = [
+        # Libera las reservas de stock de pedidos vencidos
+        asyncio.create_task(run_periodically(
+            release_expired_reservations, 60, "Reservas de stock liberadas por vencimiento",
+            after_commit=publish_stock_changes,
+        )),
+        # Borra las Idempotency-Key vencidas
+        asyncio.create_task(run_periodically(purge_expired_keys, 3600, "Idempotency-Keys vencidas eliminadas")),
+        # Borra los refresh tokens vencidos
+        asyncio.create_task(run_periodically(purge_expired_refresh_tokens, 3600, "Refresh tokens vencidos eliminados")),
+        # Invalidaciones del catálogo en memoria publicadas por otros workers
+        asyncio.create_task(catalog.listen()),
+        # Invalidaciones del cache de identidad publicadas por otros workers
+        asyncio.create_task(identity_cache.listen()),
+        # Vacía el cache del plan de producción con cada evento de venta
+        asyncio.create_task(production_plan_cache.listen()),
+    ]
+
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    for task in app.state.background_tasks:
+        task.cancel()
+    await broker.stop()
+    shutdown_executor() # Pool de procesos de variantes de imágenes
+    shutdown_pool() # Pool de procesos de bcrypt
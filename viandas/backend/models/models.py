@@ -1,8 +1,12 @@
 #models/models.py
-from sqlalchemy import Column, Integer, String, Boolean, Date, ForeignKey, Float
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, Date, DateTime, ForeignKey, Float, Index, JSON, CheckConstraint, Sequence, func, text
 from sqlalchemy.orm import relationship
 from config import Base
 
+# Secuencias de cambios para delta sync (?since=): cada INSERT/UPDATE toma el siguiente valor
+SALES_CHANGE_SEQ = Sequence("sales_change_seq")
+PRODUCTS_CHANGE_SEQ = Sequence("products_change_seq")
+
 class User(Base):
     __tablename__ = "users"
 
@@ -20,17 +24,39 @@ class User(Base):
 
 class Sale(Base):
     __tablename__ = "sales"
+    __table_args__ = (
+        # /sales/ventas: sale_in_register + fecha, ordenado por (date, id)
+        Index("ix_sales_in_register_date_id", "sale_in_register", "date", "id"),
+        # Colas vivas: índices parciales que sólo contienen los pedidos abiertos
+        Index("ix_sales_solicitados", "date", "id", postgresql_where=text("status = 'solicitado'")),
+        Index("ix_sales_confirmados", "date", "id", postgresql_where=text("status = 'confirmado'")),
+        Index("ix_sales_confirmados_user", "user_id", "date", "id", postgresql_where=text("status = 'confirmado'")),
+        CheckConstraint("status IN ('solicitado', 'confirmado', 'registrado', 'finalizado')", name="ck_sales_status"),
+        # Rangos de fecha sin filtro de estado (export, /sales/all?from=&to=)
+        Index("ix_sales_date_id", "date", "id"),
+        # Delta sync: WHERE change_seq > :since ORDER BY change_seq
+        Index("ix_sales_change_seq", "change_seq", unique=True),
+    )
+    # Traer change_seq/updated_at con RETURNING en el flush (sin lazy load en AsyncSession)
+    __mapper_args__ = {"eager_defaults": True}
 
     id = Column(Integer, primary_key=True, index=True)
     quantity_product = Column(Integer)
+    # Suma de cantidad * precio de las líneas, mantenida al escribir (scripts/check_sale_totals.py)
+    total = Column(Float, nullable=False, default=0, server_default="0")
     observation = Column(String, nullable=True)
     date = Column(Date)
     order_confirmed = Column(Boolean)
     sale_in_register = Column(Boolean)
     medioPago = Column(String, nullable=True)  # Ahora puede ser null
     pagado = Column(Boolean, default=False)
+    # Estado del flujo (core.sale_status): solicitado -> confirmado -> registrado -> finalizado
+    status = Column(String, nullable=False, default="solicitado", server_default="solicitado")
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now())
+    change_seq = Column(BigInteger, SALES_CHANGE_SEQ, nullable=False, server_default=SALES_CHANGE_SEQ.next_value(), onupdate=SALES_CHANGE_SEQ.next_value())
 
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
 
     # Relationship to User (Customer)
     user = relationship("User", back_populates="sales")
@@ -40,6 +66,13 @@ class Sale(Base):
 
 class Product(Base):
     __tablename__ = "products"
+    __table_args__ = (
+        # Delta sync: incluye los productos inactivos (tombstones)
+        Index("ix_products_change_seq", "change_seq", unique=True),
+        # /products/low-stock: sólo contiene los productos activos en o bajo su stock mínimo
+        Index("ix_products_low_stock", "id", postgresql_where=text('is_active AND stock <= "stockMinimo"')),
+    )
+    __mapper_args__ = {"eager_defaults": True}
 
     id = Column(Integer, primary_key=True, index=True)
     nombre = Column(String, nullable=False)
@@ -50,6 +83,11 @@ class Product(Base):
     stock = Column(Integer, nullable=False)
     stockMinimo = Column(Integer, nullable=False)
     is_active = Column(Boolean, default=True, nullable=False, index=True)
+    # Cantidad reservada por pedidos online aún no retirados (disponible = stock - reserved)
+    reserved = Column(Integer, nullable=False, default=0, server_default="0")
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now())
+    change_seq = Column(BigInteger, PRODUCTS_CHANGE_SEQ, nullable=False, server_default=PRODUCTS_CHANGE_SEQ.next_value(), onupdate=PRODUCTS_CHANGE_SEQ.next_value())
     
     # Relationship to LineOfSale
     line_of_sales = relationship("LineOfSale", back_populates="product")
@@ -62,9 +100,65 @@ class LineOfSale(Base):
     numeroDeLinea = Column(Integer, nullable=False)
     precio = Column(Float, nullable=False)
     
-    sale_id = Column(Integer, ForeignKey("sales.id"))
-    product_id = Column(Integer, ForeignKey("products.id"))
+    sale_id = Column(Integer, ForeignKey("sales.id"), index=True) # selectinload(Sale.line_of_sales)
+    product_id = Column(Integer, ForeignKey("products.id"), index=True)
     
     # Relationships
     sale = relationship("Sale", back_populates="line_of_sales")
     product = relationship("Product", back_populates="line_of_sales")
+
+class StockReservation(Base):
+    __tablename__ = "stock_reservations"
+    __table_args__ = (
+        # El barrido sólo mira reservas activas ordenadas por vencimiento
+        Index("ix_stock_reservations_activa_expires_at", "expires_at", postgresql_where=text("status = 'activa'")),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    cantidad = Column(Integer, nullable=False)
+    # activa -> consumida (retiro en caja) | liberada (vencida)
+    status = Column(String, nullable=False, default="activa")
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+
+    sale_id = Column(Integer, ForeignKey("sales.id"), nullable=False, index=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False, index=True)
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+
+    # scope = endpoint + usuario, para que dos usuarios no compartan claves
+    scope = Column(String, primary_key=True)
+    key = Column(String, primary_key=True)
+    request_hash = Column(String, nullable=False)
+    response_body = Column(JSON, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+class RefreshToken(Base):
+    __tablename__ = "refresh_tokens"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # HMAC-SHA256 del token opaco: la base nunca guarda el token en claro
+    token_hash = Column(String, nullable=False, unique=True)
+    # Todos los tokens de una misma sesión (login) comparten family_id
+    family_id = Column(String, nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    # used_at: rotado (ya se canjeó por uno nuevo); revoked_at: familia revocada (reuso o logout)
+    used_at = Column(DateTime(timezone=True), nullable=True)
+    revoked_at = Column(DateTime(timezone=True), nullable=True)
+
+class DailySalesRollup(Base):
+    """Resumen de ventas registradas por día x producto x medio de pago (core/rollups.py)."""
+    __tablename__ = "daily_sales_rollup"
+
+    date = Column(Date, primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    # '' para las ventas sin medio de pago (no puede ser NULL por ser parte de la PK)
+    medioPago = Column(String, primary_key=True, server_default="")
+    units = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0)
+    # Ventas que incluyen el producto (no se puede sumar entre productos)
+    sales_count = Column(Integer, nullable=False, default=0)
@@ -1,29 +1,83 @@
 # routes/auth.py
 from fastapi import APIRouter, HTTPException, Depends, status
 from fastapi.security import OAuth2PasswordRequestForm
-from datetime import timedelta
-from sqlalchemy.orm import Session
-from core.security import verify_password, create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
-from api.deps import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.security import create_user_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
+from core.passwords import verify_and_update_password
+from core import refresh_tokens
+from api.deps import get_async_db
 from models.models import User
-from schemas.schemas import Token
+from schemas.schemas import Token, RefreshTokenRequest
 
 router = APIRouter()
 
+def token_response(user: User, refresh_token: str) -> dict:
+    return {
+        "access_token": create_user_access_token(user),
+        "token_type": "bearer",
+        "refresh_token": refresh_token,
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    }
+
 @router.post("/token", response_model=Token)
-def login_for_access_token(
+async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    user = db.query(User).filter(User.email == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    result = await db.execute(select(User).where(User.email == form_data.username))
+    user = result.scalars().first()
+    # bcrypt es CPU-bound: corre en el pool de procesos de core/passwords.py
+    verified, new_hash = (False, None)
+    if user:
+        verified, new_hash = await verify_and_update_password(form_data.password, user.hashed_password)
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.email}, expires_delta=access_token_expires
-    )
-    return {"access_token": access_token, "token_type": "bearer"}
\ No newline at end of file
+    if new_hash:
+        # Hash con costo viejo: se actualiza de forma transparente
+        user.hashed_password = new_hash
+
+    refresh_token = refresh_tokens.issue(db, user.id) # Nueva familia: una por login
+    try:
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        print(f"Error guardando la sesión del usuario {user.id}: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error interno al iniciar sesión.")
+    return token_response(user, refresh_token)
+
+@router.post("/refresh", response_model=Token)
+async def refresh_access_token(
+    body: RefreshTokenRequest,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Canjea un refresh token por un access token nuevo y un refresh token nuevo (rotación).
+    No usa bcrypt: el token se busca por su HMAC. Reusar un token ya canjeado revoca la sesión.
+    """
+    user_id, refresh_token = await refresh_tokens.rotate(db, body.refresh_token)
+    user = await db.get(User, user_id)
+    if user is None:
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Usuario inexistente")
+    try:
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        print(f"Error rotando el refresh token del usuario {user_id}: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error interno al renovar la sesión.")
+    return token_response(user, refresh_token)
+
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(
+    body: RefreshTokenRequest,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Revoca la sesión (familia) del refresh token. El access token vence solo."""
+    await refresh_tokens.revoke(db, body.refresh_token)
+    await db.commit()
+    return None
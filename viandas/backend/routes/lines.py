@@ -1,35 +1,78 @@
 # routes/lines.py
-from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
-from models.models import LineOfSale, Product
-from schemas.schemas import LineOfSaleCreate, LineOfSale as LineSchema
-from api.deps import get_db, get_current_user
-from models.models import User
+from fastapi import APIRouter, HTTPException, Depends, status
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from models.models import LineOfSale, Sale
+from schemas.schemas import LineOfSaleCreate, LineOfSaleAppend
+from api.deps import get_async_db
+from core import sale_status
+from core.reservations import StockNoDisponible, reserve_stock
+from routes.sales import after_sale_commit, stock_error
 
 router = APIRouter()
 
 @router.post("/", response_model=LineOfSaleCreate)
-def create_line(
-    line : LineOfSaleCreate,
-    db: Session = Depends(get_db)
+async def create_line(
+    line : LineOfSaleAppend,
+    db: AsyncSession = Depends(get_async_db)
 ):
-    
-    product = db.query(Product).filter(Product.id == line.product_id).first()
+    """
+    Agrega una línea a un pedido todavía solicitado (sin confirmar).
+    Reserva el stock igual que create_sale y suma la línea al total y la cantidad de la venta.
+    """
+    try:
+        # Bloquear la venta: serializa los agregados concurrentes (numeroDeLinea) y la confirmación
+        sale = (await db.execute(select(Sale).where(Sale.id == line.sale_id).with_for_update())).scalars().first()
+        if not sale:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Venta no encontrada")
+        if sale.status != sale_status.SOLICITADO:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Sólo se pueden agregar líneas a pedidos solicitados (sin confirmar).",
+            )
 
-    if not product:
-     raise HTTPException(status_code=404, detail="Producto no encontrado")
+        numeros = set((await db.execute(
+            select(LineOfSale.numeroDeLinea).where(LineOfSale.sale_id == sale.id)
+        )).scalars().all())
+        numero = line.numeroDeLinea
+        if numero is None:
+            numero = max(numeros, default=0) + 1
+        elif numero in numeros:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"La venta ya tiene una línea número {numero}.",
+            )
 
-    new_line = LineOfSale(
-        cantidad = line.cantidad,
-        numeroDeLinea = line.numeroDeLinea,
-        precio = product.precioActual,
-        sale_id = line.sale_id,
-        product_id = line.product_id,
-    )
+        # Valida existencia, soft delete y stock disponible; la reserva se consume al retirar
+        prices = await reserve_stock(db, sale.id, {line.product_id: line.cantidad})
 
-    db.add(new_line)
-    db.commit()
-    db.refresh(new_line)
+        new_line = LineOfSale(
+            cantidad = line.cantidad,
+            numeroDeLinea = numero,
+            precio = prices[line.product_id],
+            sale_id = sale.id,
+            product_id = line.product_id,
+        )
+        db.add(new_line)
+        sale.total = (sale.total or 0) + line.cantidad * new_line.precio
+        sale.quantity_product = (sale.quantity_product or 0) + line.cantidad
+        await db.commit()
+    except StockNoDisponible as exc:
+        await db.rollback()
+        raise await stock_error(
+            db, exc,
+            inactive_detail="El producto '{nombre}' ya no está disponible.",
+            insufficient_detail="Stock insuficiente para '{nombre}'. Stock actual: {disponible}, Solicitado: {cantidad}",
+            not_found_detail="Producto no encontrado",
+        )
+    except HTTPException:
+        await db.rollback()
+        raise
+    except SQLAlchemyError as e:
+        await db.rollback()
+        print(f"Error de base de datos al agregar línea a la venta {line.sale_id}: {e}")
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error interno al agregar la línea.")
+
+    await after_sale_commit(db, "sale.updated", sale)
     return new_line
-   
-    
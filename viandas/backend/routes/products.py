@@ -1,19 +1,28 @@
 # viandas/backend/routes/products.py
 # (COMPLETO Y CORREGIDO para Soft Delete)
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Request, Response, UploadFile, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 # Ajusta los imports según tu estructura de proyecto
 from models import models
 from schemas import schemas
-from api.deps import get_db, get_current_user
-from typing import List
+from api.deps import get_async_db, get_current_identity
+from core.identity import Identity
+from typing import List, Optional
+from core.pagination import fetch_changes, MAX_PAGE_LIMIT
+from core.catalog import catalog, invalidate_catalog
+from core.low_stock import is_low, record_crossing, publish_low_stock_events
+from core.events import sse_response, STOCK_CHANNEL
+from core.serialization import FastJSONResponse
+from core.images import save_upload, schedule_variants, variant_name, variant_urls, PRODUCT_IMAGE_URL
+from config import AsyncSessionLocal
 
 router = APIRouter()
 
 # --- Helper para obtener el usuario admin (opcional pero recomendado) ---
-def require_admin(current_user: models.User = Depends(get_current_user)):
-    """Dependency to ensure the user is an admin."""
+def require_admin(current_user: Identity = Depends(get_current_identity)):
+    """Dependency to ensure the user is an admin (cached identity, no DB query)."""
     if current_user.role != "admin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -24,17 +33,18 @@ def require_admin(current_user: models.User = Depends(get_current_user)):
 # --- CRUD de Productos ---
 
 @router.post("/", response_model=schemas.Product, status_code=status.HTTP_201_CREATED)
-def create_product(
+async def create_product(
     product: schemas.ProductCreate,
-    db: Session = Depends(get_db),
-    admin_user: models.User = Depends(require_admin) # Requiere admin
+    db: AsyncSession = Depends(get_async_db),
+    admin_user: Identity = Depends(require_admin) # Requiere admin
 ):
     """
     Creates a new product. Only accessible by admins.
     Checks if a product with the same name already exists (active or inactive).
     """
     # Verificar si ya existe un producto con ese nombre (incluyendo inactivos)
-    existing_product = db.query(models.Product).filter(models.Product.nombre == product.nombre).first()
+    result = await db.execute(select(models.Product).where(models.Product.nombre == product.nombre))
+    existing_product = result.scalars().first()
     if existing_product:
         detail_msg = f"Ya existe un producto con el nombre '{product.nombre}'."
         if not existing_product.is_active:
@@ -49,60 +59,121 @@ def create_product(
     db_product = models.Product(**product.model_dump())
     try:
         db.add(db_product)
-        db.commit()
-        db.refresh(db_product)
+        await db.commit()
+        await db.refresh(db_product)
     except Exception as e: # Captura errores generales de DB
-        db.rollback()
+        await db.rollback()
         print(f"Error creating product: {e}") # Log error
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Error interno al crear el producto."
         )
+    await invalidate_catalog()
     return db_product
 
 
+@router.post("/upload-image/", status_code=status.HTTP_201_CREATED)
+async def upload_product_image(
+    file: UploadFile = File(...),
+    admin_user: Identity = Depends(require_admin) # Requiere admin
+):
+    """
+    Uploads a product image (JPEG, PNG or WebP). Only accessible by admins.
+    The file is stored under its sha256, so re-uploading the same image is free.
+    Returns the medium variant filename to store in Product.foto; the WebP variants are
+    generated in the background and the original is served until they are ready.
+    """
+    try:
+        digest, original_path = await save_upload(file)
+    finally:
+        await file.close()
+
+    schedule_variants(original_path, digest)
+    return {
+        "filename": variant_name(digest, "medium"), # Lo que el frontend guarda en Product.foto
+        "original": f"{PRODUCT_IMAGE_URL}/{original_path.name}",
+        "variants": variant_urls(digest),
+    }
+
+
 @router.get("/", response_model=List[schemas.Product])
-def read_products(
+async def read_products(
+    response: Response,
     skip: int = 0,
-    limit: int = 100,
-    db: Session = Depends(get_db)
+    limit: int = Query(100, ge=1, le=MAX_PAGE_LIMIT),
+    since: Optional[int] = Query(None, ge=0, description="Delta sync: productos cambiados después de este valor (header X-Next-Since)"),
     # current_user: models.User = Depends(get_current_user) # Descomentar si requiere login
 ):
     """
-    Gets a list of ACTIVE products.
+    Gets a list of ACTIVE products, served from the in-memory catalogue (no DB session).
+    With `since`, returns every product changed after that value (inactive ones included,
+    as tombstones with is_active=false) and the next value in the X-Next-Since header.
     Accessible by anyone (or logged-in users if dependency uncommented).
     """
     try:
-        products = db.query(models.Product)\
-                     .filter(models.Product.is_active == True)\
-                     .order_by(models.Product.nombre)\
-                     .offset(skip)\
-                     .limit(limit)\
-                     .all()
+        if since is not None:
+            async with AsyncSessionLocal() as db:
+                products, next_since = await fetch_changes(db, select(models.Product), models.Product, since, limit)
+            response.headers["X-Next-Since"] = str(next_since)
+            return products
+
+        return FastJSONResponse(await catalog.list(skip, limit))
     except Exception as e:
         print(f"Error reading products: {e}") # Log error
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Error interno al obtener los productos."
         )
+
+
+@router.get("/low-stock", response_model=List[schemas.Product])
+async def read_low_stock_products(
+    db: AsyncSession = Depends(get_async_db),
+    admin_user: Identity = Depends(require_admin) # Requiere admin
+):
+    """
+    Lists active products at or below their stockMinimo, most urgent first.
+    Only accessible by admins. Served by the partial index ix_products_low_stock.
+    """
+    try:
+        result = await db.execute(
+            select(models.Product)
+            .where(models.Product.is_active, models.Product.stock <= models.Product.stockMinimo)
+            .order_by(models.Product.stock - models.Product.stockMinimo, models.Product.nombre)
+        )
+        products = result.scalars().all()
+    except Exception as e:
+        print(f"Error reading low stock products: {e}") # Log error
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Error interno al obtener los productos con stock bajo."
+        )
     return products
 
 
+@router.get("/low-stock/events")
+async def low_stock_events(
+    request: Request,
+    admin_user: Identity = Depends(require_admin) # Requiere admin
+):
+    """
+    SSE stream of stock threshold crossings: product.low_stock when a product drops to
+    its stockMinimo or below, product.stock_recovered when it goes back above. One event per crossing.
+    """
+    return sse_response(request, STOCK_CHANNEL)
+
+
 @router.get("/{product_id}", response_model=schemas.Product)
-def read_product(
+async def read_product(
     product_id: int,
-    db: Session = Depends(get_db)
     # current_user: models.User = Depends(get_current_user) # Descomentar si requiere login
 ):
     """
-    Gets a specific product by ID, only if it's ACTIVE.
+    Gets a specific product by ID, only if it's ACTIVE, from the in-memory catalogue.
     Accessible by anyone (or logged-in users if dependency uncommented).
     """
     try:
-        db_product = db.query(models.Product)\
-                       .filter(models.Product.id == product_id)\
-                       .filter(models.Product.is_active == True)\
-                       .first()
+        db_product = await catalog.get(product_id)
     except Exception as e:
         print(f"Error reading product {product_id}: {e}") # Log error
         raise HTTPException(
@@ -113,30 +184,41 @@ def read_product(
     if db_product is None:
         # Devuelve 404 si no existe O si no está activo
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Producto no encontrado")
-    return db_product
+    return FastJSONResponse(db_product)
 
 
 @router.put("/{product_id}", response_model=schemas.Product)
-def update_product(
+async def update_product(
     product_id: int,
     product_update: schemas.ProductUpdate, # Usar el schema específico de Update
-    db: Session = Depends(get_db),
-    admin_user: models.User = Depends(require_admin) # Requiere admin
+    db: AsyncSession = Depends(get_async_db),
+    admin_user: Identity = Depends(require_admin) # Requiere admin
 ):
     """
     Updates an existing product. Only accessible by admins.
     Allows updating any field, including is_active.
     """
-    db_product = db.query(models.Product).filter(models.Product.id == product_id).first()
+    update_data = product_update.model_dump(exclude_unset=True)
+    # Si cambia el stock, bloquear la fila: las reservas concurrentes (UPDATE condicional) esperan
+    db_product = await db.get(models.Product, product_id, with_for_update="stock" in update_data)
     if db_product is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Producto no encontrado para actualizar")
 
+    # El stock no puede quedar por debajo de lo reservado por pedidos: no se podrían retirar
+    new_stock = update_data.get("stock")
+    if new_stock is not None and new_stock < db_product.reserved:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"El stock ({new_stock}) no puede ser menor que lo reservado por pedidos ({db_product.reserved}).",
+        )
+
     # Verificar si se intenta cambiar el nombre a uno que ya existe (y no es el producto actual)
     if product_update.nombre and product_update.nombre != db_product.nombre:
-         existing_product = db.query(models.Product).filter(
+         result = await db.execute(select(models.Product).where(
                 models.Product.nombre == product_update.nombre,
                 models.Product.id != product_id # Excluir el producto actual
-            ).first()
+            ))
+         existing_product = result.scalars().first()
          if existing_product:
               raise HTTPException(
                  status_code=status.HTTP_409_CONFLICT,
@@ -145,34 +227,37 @@ def update_product(
 
     # Actualizar los campos proporcionados en product_update
     # model_dump(exclude_unset=True) solo incluye los campos enviados en el request
-    update_data = product_update.model_dump(exclude_unset=True)
+    was_low = is_low(db_product.stock, db_product.stockMinimo)
     for key, value in update_data.items():
         setattr(db_product, key, value)
+    record_crossing(db, db_product.id, was_low, db_product.stock, db_product.stockMinimo)
 
     try:
-        db.commit()
-        db.refresh(db_product)
+        await db.commit()
+        await db.refresh(db_product)
     except Exception as e: # Captura errores generales de DB
-        db.rollback()
+        await db.rollback()
         print(f"Error updating product {product_id}: {e}") # Log error
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Error interno al actualizar el producto."
         )
+    await invalidate_catalog()
+    await publish_low_stock_events(db)
     return db_product
 
 
 @router.delete("/{product_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_product(
+async def delete_product(
     product_id: int,
-    db: Session = Depends(get_db),
-    admin_user: models.User = Depends(require_admin) # Requiere admin
+    db: AsyncSession = Depends(get_async_db),
+    admin_user: Identity = Depends(require_admin) # Requiere admin
 ):
     """
     Performs a soft delete on a product by setting is_active=False.
     Only accessible by admins. Returns 204 No Content on success.
     """
-    db_product = db.query(models.Product).filter(models.Product.id == product_id).first()
+    db_product = await db.get(models.Product, product_id)
 
     if db_product is None:
         # Si no existe, devolver 404 igual
@@ -182,14 +267,15 @@ def delete_product(
     if db_product.is_active:
         db_product.is_active = False
         try:
-            db.commit()
+            await db.commit()
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             print(f"Error soft deleting product {product_id}: {e}") # Log error
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Error interno al eliminar lógicamente el producto."
             )
+        await invalidate_catalog()
     else:
         # Si ya estaba inactivo, no hacer nada y devolver éxito (204)
         # Opcionalmente podrías devolver un 304 Not Modified, pero 204 es simple.
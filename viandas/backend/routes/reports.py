@@ -0,0 +1,102 @@
+# routes/reports.py
+# Reportes de ventas registradas leídos del rollup diario (core/rollups.py).
+
+from datetime import date, datetime, timedelta
+from typing import Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.deps import get_async_db, get_current_identity
+from core.identity import Identity
+from models.models import DailySalesRollup, Product
+from schemas.schemas import SalesReport
+import pytz
+
+router = APIRouter()
+
+ARGENTINA_TZ = pytz.timezone('America/Argentina/Buenos_Aires')
+
+# --- Helper para requerir admin ---
+def require_admin(current_user: Identity = Depends(get_current_identity)):
+    """Dependency to ensure the user is an admin."""
+    if current_user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Acceso denegado: Requiere permisos de administrador",
+        )
+    return current_user
+
+def period_range(period: str, day: date):
+    """Rango [desde, hasta] del día, la semana (lunes a domingo) o el mes que contiene a `day`."""
+    if period == "week":
+        start = day - timedelta(days=day.weekday())
+        return start, start + timedelta(days=6)
+    if period == "month":
+        start = day.replace(day=1)
+        next_month = (start + timedelta(days=32)).replace(day=1)
+        return start, next_month - timedelta(days=1)
+    return day, day
+
+
+@router.get("/sales", response_model=SalesReport)
+async def sales_report(
+    period: Literal["day", "week", "month"] = Query("day", description="Período a resumir"),
+    day: Optional[date] = Query(None, alias="date", description="Fecha dentro del período (por defecto hoy)"),
+    db: AsyncSession = Depends(get_async_db),
+    admin_user: Identity = Depends(require_admin) # Requiere admin
+):
+    """
+    Totales de ventas registradas del período: por medio de pago, por producto y por día.
+    Sólo lee el rollup diario (unas pocas filas por día), no las ventas ni sus líneas.
+    """
+    if day is None:
+        day = datetime.now(ARGENTINA_TZ).date()
+    from_date, to_date = period_range(period, day)
+    in_range = (DailySalesRollup.date >= from_date, DailySalesRollup.date <= to_date)
+    units = func.coalesce(func.sum(DailySalesRollup.units), 0).label("units")
+    revenue = func.coalesce(func.sum(DailySalesRollup.revenue), 0.0).label("revenue")
+
+    try:
+        by_payment = (await db.execute(
+            select(DailySalesRollup.medioPago, units, revenue)
+            .where(*in_range)
+            .group_by(DailySalesRollup.medioPago)
+            .order_by(DailySalesRollup.medioPago)
+        )).all()
+        by_product = (await db.execute(
+            select(
+                DailySalesRollup.product_id, Product.nombre, units, revenue,
+                func.sum(DailySalesRollup.sales_count).label("sales_count"),
+            )
+            .join(Product, Product.id == DailySalesRollup.product_id)
+            .where(*in_range)
+            .group_by(DailySalesRollup.product_id, Product.nombre)
+            .order_by(revenue.desc())
+        )).all()
+        by_day = (await db.execute(
+            select(DailySalesRollup.date, units, revenue)
+            .where(*in_range)
+            .group_by(DailySalesRollup.date)
+            .order_by(DailySalesRollup.date)
+        )).all()
+    except Exception as e:
+        print(f"Error generando reporte de ventas {period} {day}: {e}")
+        raise HTTPException(status_code=500, detail="Error interno al generar el reporte.")
+
+    return {
+        "period": period,
+        "from_date": from_date,
+        "to_date": to_date,
+        "totals": {
+            "units": sum(row.units for row in by_payment),
+            "revenue": sum(row.revenue for row in by_payment),
+        },
+        "by_payment": [
+            {"medioPago": row.medioPago or None, "units": row.units, "revenue": row.revenue}
+            for row in by_payment
+        ],
+        "by_product": [row._asdict() for row in by_product],
+        "by_day": [row._asdict() for row in by_day],
+    }
@@ -1,14 +1,33 @@
 # viandas/backend/routes/sales.py
 # (COMPLETO Y CORREGIDO con validación is_active)
 
-from fastapi import APIRouter, Depends, HTTPException, Body, status, Query 
-from sqlalchemy.orm import Session, joinedload, selectinload
+from fastapi import APIRouter, Depends, HTTPException, Body, status, Query, Header, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 # Asegúrate que los imports sean correctos para tu estructura
 from models.models import Sale, User, LineOfSale, Product
-from schemas.schemas import SaleWithLines, LineOfSaleCreate, SaleAdminView, User as UserSchema # Renombrar UserSchema si choca
-from api.deps import get_db, get_current_user
+from schemas.schemas import SaleWithLines, LineOfSaleCreate, SaleAdminView
+from schemas.schemas import SalesCompactPage, ProductionPlan
+from api.deps import get_async_db, get_current_identity
+from core.identity import Identity
+from core.reservations import (
+    StockNoDisponible, sum_quantities, reserve_stock, decrement_stock,
+    renew_reservations, consume_reservations,
+)
+from core import idempotency
+from core import sale_status
+from core.pagination import fetch_page, fetch_changes, DEFAULT_PAGE_LIMIT, MAX_PAGE_LIMIT
+from core.sales_export import build_export_query, stream_csv, stream_ndjson
+from core.serialization import FastJSONResponse, sales_to_rows, sales_to_compact
+from core.events import publish_sale_event, sse_response, SALES_CHANNEL
+from core.catalog import publish_stock_changes
+from core.low_stock import publish_low_stock_events
+from core.rollups import add_sale_to_rollup
+from core.production import production_plan_cache
 from datetime import date, datetime
-from typing import List, Optional 
+from typing import List, Literal, Optional, Union
 import pytz # Para zona horaria
 from sqlalchemy.exc import SQLAlchemyError # Para manejo de errores DB
 
@@ -22,7 +41,7 @@ def get_current_argentina_date():
     return datetime.now(argentina_tz).date() # Usar .date() para obtener solo la fecha
 
 # --- Helper para requerir admin ---
-def require_admin(current_user: UserSchema = Depends(get_current_user)):
+def require_admin(current_user: Identity = Depends(get_current_identity)):
     """Dependency to ensure the user is an admin."""
     if not hasattr(current_user, 'role') or current_user.role != "admin":
         raise HTTPException(
@@ -31,15 +50,115 @@ def require_admin(current_user: UserSchema = Depends(get_current_user)):
         )
     return current_user
 
+# --- Helper para traducir errores de stock a HTTP ---
+async def stock_error(
+    db: AsyncSession,
+    exc: StockNoDisponible,
+    inactive_detail: str,
+    insufficient_detail: str,
+    not_found_status: int = status.HTTP_404_NOT_FOUND,
+    not_found_detail: str = "Producto con id {product_id} no encontrado.",
+) -> HTTPException:
+    """
+    Los UPDATE condicionales de core.reservations sólo dicen QUÉ producto falló.
+    Este helper lee el producto (después del rollback) para armar el mismo mensaje
+    que devolvía la validación línea por línea.
+    """
+    product = await db.get(Product, exc.product_id)
+    if product is None:
+        return HTTPException(status_code=not_found_status, detail=not_found_detail.format(product_id=exc.product_id))
+    if not product.is_active:
+        return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=inactive_detail.format(nombre=product.nombre))
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail=insufficient_detail.format(
+            nombre=product.nombre,
+            disponible=product.stock - product.reserved,
+            cantidad=exc.cantidad,
+        )
+    )
+
+# --- Helpers para cargar ventas completas ---
+# En async no hay lazy loading: toda venta que se devuelve como SaleAdminView
+# tiene que salir de select_sales_full() con usuario, líneas y productos precargados.
+def select_sales_full():
+    return select(Sale).options(
+        selectinload(Sale.user),
+        selectinload(Sale.line_of_sales).selectinload(LineOfSale.product) # Carga producto activo o inactivo
+    )
+
+async def load_sale_full(db: AsyncSession, sale_id: int) -> Optional[Sale]:
+    """Carga (o recarga, pisando el estado en memoria) una venta con todas sus relaciones."""
+    result = await db.execute(
+        select_sales_full().where(Sale.id == sale_id).execution_options(populate_existing=True)
+    )
+    return result.scalars().one_or_none()
+
+# --- Helper para serializar una venta completa dentro de la transacción ---
+async def serialize_sale(db: AsyncSession, sale_id: int) -> dict:
+    """Carga la venta con usuario, líneas y productos y la devuelve como SaleAdminView en formato JSON."""
+    sale = await load_sale_full(db, sale_id)
+    return SaleAdminView.model_validate(sale).model_dump(mode="json")
+
+def lines_total(lines) -> float:
+    """Total de una venta a partir de sus líneas (dicts con cantidad y precio)."""
+    return sum(line["cantidad"] * line["precio"] for line in lines)
+
+async def after_sale_commit(db: AsyncSession, event_type: str, sale: Sale) -> None:
+    """Publica lo que dejó la transacción ya commiteada: stock al catálogo, cruces de stock mínimo y el evento de la venta."""
+    await publish_stock_changes(db)
+    await publish_low_stock_events(db)
+    await publish_sale_event(event_type, sale)
+
+# --- Helpers para los listados paginados ---
+def filter_date_range(stmt, from_date: Optional[date], to_date: Optional[date]):
+    """Filtra por rango de fechas de la venta (ambos extremos inclusive)."""
+    if from_date:
+        stmt = stmt.where(Sale.date >= from_date)
+    if to_date:
+        stmt = stmt.where(Sale.date <= to_date)
+    return stmt
+
+# Los listados se piden enteros por defecto (el frontend no sigue X-Next-Cursor); paginar es opcional
+LIMIT_QUERY = Query(None, ge=1, le=MAX_PAGE_LIMIT, description="Cantidad máxima de ventas por página (por defecto, todas)")
+CURSOR_QUERY = Query(None, description="Cursor opaco de la página siguiente (header X-Next-Cursor)")
+FROM_QUERY = Query(None, alias="from", description="Fecha mínima de venta, inclusive (YYYY-MM-DD)")
+TO_QUERY = Query(None, alias="to", description="Fecha máxima de venta, inclusive (YYYY-MM-DD)")
+SINCE_QUERY = Query(None, ge=0, description="Delta sync: sólo filas cambiadas después de este valor (header X-Next-Since)")
+VIEW_QUERY = Query("full", description="'compact' devuelve referencias por id y diccionarios de productos/usuarios sin repetir")
+
+SalesListResponse = Union[List[SaleAdminView], SalesCompactPage]
+
+def list_response(sales, next_cursor: Optional[str] = None, view: str = "full", next_since: Optional[int] = None) -> FastJSONResponse:
+    """
+    Serializa un listado de ventas con la capa rápida (sin re-validar los objetos ORM).
+    El cuerpo sigue siendo una lista; el cursor de la página siguiente viaja en el header X-Next-Cursor
+    y, en delta sync, el próximo `since` en X-Next-Since.
+    """
+    headers = {}
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    if next_since is not None:
+        headers["X-Next-Since"] = str(next_since)
+    if view == "compact":
+        return FastJSONResponse(sales_to_compact(sales, next_cursor), headers=headers)
+    return FastJSONResponse(sales_to_rows(sales), headers=headers)
+
+# --- Helper para responder un reintento con la respuesta original ---
+def idempotent_replay(response_body: dict) -> JSONResponse:
+    return JSONResponse(content=response_body, headers={"Idempotent-Replayed": "true"})
+
 @router.post("/online", response_model=SaleAdminView)
-def create_sale(
+async def create_sale(
     sales_data: SaleWithLines,
-    current_user: User = Depends(get_current_user), # Usar Modelo User
-    db: Session = Depends(get_db)
+    current_user: Identity = Depends(get_current_identity), # Identidad cacheada: sólo se usa el id
+    db: AsyncSession = Depends(get_async_db),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
     """
     Crea un nuevo pedido online para el usuario logueado.
     Valida medio de pago y que los productos estén activos.
+    Con el header Idempotency-Key, un reintento devuelve la venta ya creada.
     """
     lines_data = sales_data.line_of_sales
     if not lines_data:
@@ -61,69 +180,79 @@ def create_sale(
         order_confirmed=False,
         sale_in_register=False,
         pagado=False,
+        status=sale_status.SOLICITADO,
         medioPago=sales_data.medioPago,
         user_id=current_user.id
     )
-
-    db.add(new_sale)
+    idempotency_scope = f"sales/online:{current_user.id}"
 
     try:
-        db.flush() # Obtener el ID de new_sale ANTES del bucle
-
-        for index, line_data in enumerate(lines_data):
-            # Bloquear producto para evitar race conditions
-            product = db.query(Product).filter(Product.id == line_data.product_id).with_for_update().first()
-
-            if not product:
-                # No es necesario rollback aquí, fallará el commit general
-                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Producto con id {line_data.product_id} no encontrado.")
-
-            # --- VALIDACIÓN SOFT DELETE ---
-            if not product.is_active:
-                 raise HTTPException(
-                     status_code=status.HTTP_400_BAD_REQUEST,
-                     detail=f"El producto '{product.nombre}' ya no está disponible."
-                 )
-            # ----------------------------
-
-            # Verificar stock ANTES de crear la línea
-            if product.stock < line_data.cantidad:
-                 raise HTTPException(
-                    status_code=status.HTTP_409_CONFLICT,
-                    detail=f"Stock insuficiente para '{product.nombre}'. Stock actual: {product.stock}, Solicitado: {line_data.cantidad}"
-                )
-
-            # No descontar stock para pedidos online aquí
-
-            new_line = LineOfSale(
+        if idempotency_key:
+            # Espera a un duplicado en vuelo y, si ya se procesó, devuelve la respuesta original
+            fingerprint = idempotency.request_fingerprint(sales_data)
+            await idempotency.acquire(db, idempotency_scope, idempotency_key)
+            replay = await idempotency.lookup(db, idempotency_scope, idempotency_key, fingerprint)
+            if replay is not None:
+                await db.rollback() # Libera el advisory lock
+                return idempotent_replay(replay)
+
+        db.add(new_sale)
+        await db.flush() # Obtener el ID de new_sale ANTES de armar las líneas
+
+        # Reservar el stock del pedido (un UPDATE condicional para todos los productos).
+        # Valida existencia, soft delete y stock disponible (stock - reservado).
+        # El stock se descuenta recién al registrar el retiro en caja.
+        prices = await reserve_stock(db, new_sale.id, sum_quantities(lines_data))
+
+        new_lines = [
+            dict(
                 cantidad=line_data.cantidad,
                 numeroDeLinea=index + 1,
-                precio=product.precioActual,
+                precio=prices[line_data.product_id],
                 sale_id=new_sale.id, # Usar ID obtenido del flush
                 product_id=line_data.product_id,
             )
-            db.add(new_line)
-            # No es necesario el append a new_lines_objects si no se usa
-
-        db.commit() # Confirmar todos los cambios (venta, líneas)
-
+            for index, line_data in enumerate(lines_data)
+        ]
+
+        # Insertar todas las líneas en un único INSERT
+        await db.execute(insert(LineOfSale), new_lines)
+        new_sale.total = lines_total(new_lines)
+        await db.flush() # autoflush está desactivado: escribir el total antes de recargar la venta
+
+        if idempotency_key:
+            # Guardar la respuesta en la misma transacción que la venta
+            response_body = await serialize_sale(db, new_sale.id)
+            await idempotency.store(db, idempotency_scope, idempotency_key, fingerprint, response_body)
+
+        await db.commit() # Confirmar todos los cambios (venta, líneas, reservas)
+
+    except StockNoDisponible as exc:
+        await db.rollback()
+        raise await stock_error(
+            db, exc,
+            inactive_detail="El producto '{nombre}' ya no está disponible.",
+            insufficient_detail="Stock insuficiente para '{nombre}'. Stock actual: {disponible}, Solicitado: {cantidad}",
+        )
     except HTTPException as http_exc:
-         db.rollback() # Revertir si hubo un error HTTP esperado
+         await db.rollback() # Revertir si hubo un error HTTP esperado
          raise http_exc
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         print(f"Error de base de datos al crear venta online: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error interno al procesar el pedido.")
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         print(f"Error inesperado al crear venta online: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error inesperado al crear el pedido.")
 
-    # Cargar relaciones para la respuesta completa de forma eficiente
-    sale_for_response = db.query(Sale).options(
-        selectinload(Sale.user),
-        selectinload(Sale.line_of_sales).selectinload(LineOfSale.product) # Carga producto activo o inactivo
-    ).filter(Sale.id == new_sale.id).one_or_none() # one_or_none es más seguro
+    await after_sale_commit(db, "sale.created", new_sale)
+
+    if idempotency_key:
+        return response_body
+
+    # Recargar con relaciones para la respuesta completa
+    sale_for_response = await load_sale_full(db, new_sale.id)
 
     if not sale_for_response:
          # Si no se encuentra después del commit, algo raro pasó
@@ -134,123 +263,172 @@ def create_sale(
 
 # --- Rutas de Admin ---
 
-@router.get("/all", response_model=List[SaleAdminView])
-def get_all_sales_admin(
-    db: Session = Depends(get_db),
-    admin_user: UserSchema = Depends(require_admin) # Requiere admin
+@router.get("/all", response_model=SalesListResponse)
+async def get_all_sales_admin(
+    db: AsyncSession = Depends(get_async_db),
+    admin_user: Identity = Depends(require_admin), # Requiere admin
+    limit: Optional[int] = LIMIT_QUERY,
+    cursor: Optional[str] = CURSOR_QUERY,
+    from_date: Optional[date] = FROM_QUERY,
+    to_date: Optional[date] = TO_QUERY,
+    view: Literal["full", "compact"] = VIEW_QUERY,
+    since: Optional[int] = SINCE_QUERY,
 ):
-    """Obtiene todas las ventas (admin)."""
+    """
+    Obtiene todas las ventas (admin), paginadas de la más nueva a la más vieja.
+    Con `since` devuelve sólo las ventas creadas o modificadas después de ese valor,
+    en orden de cambio; el valor para el próximo pedido viaja en X-Next-Since.
+    """
+    if since is not None and cursor:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Usar 'cursor' o 'since', no ambos.")
     try:
-        sales = db.query(Sale).options(
-            selectinload(Sale.user),
-            selectinload(Sale.line_of_sales).selectinload(LineOfSale.product) # Carga producto activo o inactivo
-        ).order_by(Sale.id.desc()).all()
+        stmt = filter_date_range(select_sales_full(), from_date, to_date)
+        if since is not None:
+            # El delta sync sí pagina siempre: el cliente sigue X-Next-Since
+            sales, next_since = await fetch_changes(db, stmt, Sale, since, limit or DEFAULT_PAGE_LIMIT)
+            return list_response(sales, view=view, next_since=next_since)
+        sales, next_cursor = await fetch_page(db, stmt, [Sale.id], True, cursor, limit)
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error reading all sales: {e}")
         raise HTTPException(status_code=500, detail="Error interno al obtener las ventas.")
-    return sales
+    return list_response(sales, next_cursor, view)
 
 @router.get("/admin/{sale_id}", response_model=SaleAdminView)
-def get_sale_by_id_admin(
+async def get_sale_by_id_admin(
     sale_id: int,
-    db: Session = Depends(get_db),
-    admin_user: UserSchema = Depends(require_admin) # Requiere admin
+    db: AsyncSession = Depends(get_async_db),
+    admin_user: Identity = Depends(require_admin) # Requiere admin
 ):
     """Obtiene una venta específica por ID (admin)."""
-    sale = db.query(Sale).options(
-        selectinload(Sale.user),
-        selectinload(Sale.line_of_sales).selectinload(LineOfSale.product) # Carga producto activo o inactivo
-    ).filter(Sale.id == sale_id).first()
+    sale = await load_sale_full(db, sale_id)
     if not sale:
         raise HTTPException(status_code=404, detail="Venta no encontrada")
     return sale
 
 @router.put("/{sale_id}/confirm", response_model=SaleAdminView)
-def confirm_sale_admin(
+async def confirm_sale_admin(
     sale_id: int,
-    db: Session = Depends(get_db),
-    admin_user: UserSchema = Depends(require_admin) # Requiere admin
+    db: AsyncSession = Depends(get_async_db),
+    admin_user: Identity = Depends(require_admin) # Requiere admin
 ):
-    """Confirma un pedido online (admin)."""
-    sale = db.query(Sale).filter(Sale.id == sale_id).first()
+    """Confirma un pedido online (admin). Extiende (o renueva) la reserva de stock hasta el retiro."""
+    # FOR UPDATE: una línea agregada en paralelo (routes/lines.py) entra antes o no entra
+    result = await db.execute(
+        select(Sale).options(selectinload(Sale.line_of_sales)).where(Sale.id == sale_id).with_for_update()
+    )
+    sale = result.scalars().first()
     if not sale:
         raise HTTPException(status_code=404, detail="Venta no encontrada")
     if sale.order_confirmed:
-         return sale # Ya está confirmada, operación idempotente
+         return await load_sale_full(db, sale.id) # Ya está confirmada, operación idempotente
 
-    sale.order_confirmed = True
+    sale_status.mark_confirmed(sale)
     try:
-        db.commit()
-        db.refresh(sale) # Refrescar para obtener estado actualizado
+        if not sale.sale_in_register:
+            await renew_reservations(db, sale.id, sum_quantities(sale.line_of_sales))
+        await db.commit()
+    except StockNoDisponible as exc:
+        await db.rollback()
+        raise await stock_error(
+            db, exc,
+            inactive_detail="El producto '{nombre}' ya no está disponible.",
+            insufficient_detail="Stock insuficiente para '{nombre}' al confirmar el pedido. Stock disponible: {disponible}, Pedido: {cantidad}",
+        )
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         print(f"Error confirming sale {sale_id}: {e}")
         raise HTTPException(status_code=500, detail="Error interno al confirmar la venta.")
 
+    await after_sale_commit(db, "sale.confirmed", sale)
+
     # Recargar con relaciones para la respuesta completa
-    sale_for_response = db.query(Sale).options(
-        selectinload(Sale.user),
-        selectinload(Sale.line_of_sales).selectinload(LineOfSale.product)
-    ).filter(Sale.id == sale.id).one_or_none() # Usar one_or_none
+    sale_for_response = await load_sale_full(db, sale.id)
 
     if not sale_for_response:
          raise HTTPException(status_code=500, detail="Error al recuperar la venta confirmada.")
 
     return sale_for_response
 
-@router.get("/pedidos-solicitados", response_model=List[SaleAdminView])
-def get_pedidos_solicitados(
-    db: Session = Depends(get_db),
-    admin_user: UserSchema = Depends(require_admin) # Requiere admin
+@router.get("/pedidos-solicitados", response_model=SalesListResponse)
+async def get_pedidos_solicitados(
+    db: AsyncSession = Depends(get_async_db),
+    admin_user: Identity = Depends(require_admin), # Requiere admin
+    limit: Optional[int] = LIMIT_QUERY,
+    cursor: Optional[str] = CURSOR_QUERY,
+    from_date: Optional[date] = FROM_QUERY,
+    to_date: Optional[date] = TO_QUERY,
+    view: Literal["full", "compact"] = VIEW_QUERY,
 ):
-    """Obtiene pedidos online no confirmados ni registrados (admin)."""
+    """Obtiene pedidos online no confirmados ni registrados (admin), del más viejo al más nuevo."""
     try:
-        sales = db.query(Sale).options(
-            selectinload(Sale.user),
-            selectinload(Sale.line_of_sales).selectinload(LineOfSale.product)
-        ).filter(
-            Sale.order_confirmed == False,
-            Sale.sale_in_register == False
-        ).order_by(Sale.date.asc(), Sale.id.asc()).all()
+        # Índice parcial ix_sales_solicitados (sólo pedidos vivos)
+        stmt = select_sales_full().where(Sale.status == sale_status.SOLICITADO)
+        stmt = filter_date_range(stmt, from_date, to_date)
+        sales, next_cursor = await fetch_page(db, stmt, [Sale.date, Sale.id], False, cursor, limit)
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error fetching pedidos solicitados: {e}")
         raise HTTPException(status_code=500, detail="Error interno al obtener los pedidos solicitados.")
-    return sales
-
-@router.get("/pendientes-retiro", response_model=List[SaleAdminView])
-def get_pedidos_pendientes_retiro(
-    db: Session = Depends(get_db),
-    admin_user: UserSchema = Depends(require_admin) # Requiere admin
+    return list_response(sales, next_cursor, view)
+
+@router.get("/pendientes-retiro", response_model=SalesListResponse)
+async def get_pedidos_pendientes_retiro(
+    db: AsyncSession = Depends(get_async_db),
+    admin_user: Identity = Depends(require_admin), # Requiere admin
+    limit: Optional[int] = LIMIT_QUERY,
+    cursor: Optional[str] = CURSOR_QUERY,
+    from_date: Optional[date] = FROM_QUERY,
+    to_date: Optional[date] = TO_QUERY,
+    view: Literal["full", "compact"] = VIEW_QUERY,
 ):
-    """Obtiene pedidos online confirmados pero no registrados (admin)."""
+    """Obtiene pedidos online confirmados pero no registrados (admin), del más viejo al más nuevo."""
     try:
-        sales = db.query(Sale).options(
-            selectinload(Sale.user),
-            selectinload(Sale.line_of_sales).selectinload(LineOfSale.product)
-        ).filter(
-            Sale.order_confirmed == True,
-            Sale.sale_in_register == False
-        ).order_by(Sale.date.asc(), Sale.id.asc()).all()
+        # Índice parcial ix_sales_confirmados (sólo pedidos vivos)
+        stmt = select_sales_full().where(Sale.status == sale_status.CONFIRMADO)
+        stmt = filter_date_range(stmt, from_date, to_date)
+        sales, next_cursor = await fetch_page(db, stmt, [Sale.date, Sale.id], False, cursor, limit)
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error fetching pendientes retiro: {e}")
         raise HTTPException(status_code=500, detail="Error interno al obtener los pedidos pendientes.")
-    return sales
+    return list_response(sales, next_cursor, view)
 
-@router.get("/ventas", response_model=List[SaleAdminView])
-def get_ventas_finalizadas(
-    db: Session = Depends(get_db),
-    admin_user: UserSchema = Depends(require_admin), # Requiere admin
+@router.get("/production-plan", response_model=ProductionPlan)
+async def get_production_plan(
+    target_date: Optional[date] = Query(None, alias="date", description="Fecha de los pedidos (por defecto hoy)"),
+    admin_user: Identity = Depends(require_admin) # Requiere admin
+):
+    """
+    Cantidades a preparar por producto para los pedidos solicitados y confirmados de la fecha.
+    Sale de un cache corto que se vacía con cada cambio de ventas.
+    """
+    try:
+        return await production_plan_cache.get(target_date or get_current_argentina_date())
+    except Exception as e:
+        print(f"Error calculando el plan de producción: {e}")
+        raise HTTPException(status_code=500, detail="Error interno al calcular el plan de producción.")
+
+@router.get("/ventas", response_model=SalesListResponse)
+async def get_ventas_finalizadas(
+    db: AsyncSession = Depends(get_async_db),
+    admin_user: Identity = Depends(require_admin), # Requiere admin
     # --- AÑADIR ESTE PARÁMETRO ---
-    sale_date: Optional[date] = Query(None, description="Filtrar ventas por una fecha específica (YYYY-MM-DD)")
+    sale_date: Optional[date] = Query(None, description="Filtrar ventas por una fecha específica (YYYY-MM-DD)"),
     # -----------------------------
+    limit: Optional[int] = LIMIT_QUERY,
+    cursor: Optional[str] = CURSOR_QUERY,
+    from_date: Optional[date] = FROM_QUERY,
+    to_date: Optional[date] = TO_QUERY,
+    view: Literal["full", "compact"] = VIEW_QUERY,
 ):
-    """Obtiene ventas ya registradas en caja (admin), opcionalmente filtradas por fecha."""
+    """Obtiene ventas ya registradas en caja (admin), opcionalmente filtradas por fecha o rango de fechas."""
     try:
         # Iniciar la query base
-        query = db.query(Sale).options(
-            selectinload(Sale.user),
-            selectinload(Sale.line_of_sales).selectinload(LineOfSale.product)
-        ).filter(
+        query = select_sales_full().where(
             Sale.sale_in_register == True # Mantener el filtro original
         )
 
@@ -258,44 +436,64 @@ def get_ventas_finalizadas(
         if sale_date:
             # Filtrar por la fecha exacta proporcionada
             # Asumiendo que Sale.date es de tipo Date en el modelo
-            query = query.filter(Sale.date == sale_date)
+            query = query.where(Sale.date == sale_date)
         # ------------------------------------
+        query = filter_date_range(query, from_date, to_date)
 
-        # Aplicar ordenamiento y ejecutar la query
-        sales = query.order_by(Sale.date.desc(), Sale.id.desc()).all()
+        # Ordenar de la más nueva a la más vieja y traer una página
+        sales, next_cursor = await fetch_page(db, query, [Sale.date, Sale.id], True, cursor, limit)
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error fetching ventas finalizadas: {e}")
         raise HTTPException(status_code=500, detail="Error interno al obtener las ventas finalizadas.")
-    return sales
+    return list_response(sales, next_cursor, view)
+
+@router.get("/export")
+async def export_sales(
+    admin_user: Identity = Depends(require_admin), # Requiere admin
+    format: Literal["csv", "ndjson"] = Query("csv", description="Formato de salida"),
+    from_date: Optional[date] = FROM_QUERY,
+    to_date: Optional[date] = TO_QUERY,
+    registered_only: bool = Query(True, description="Sólo ventas registradas en caja"),
+):
+    """
+    Exporta ventas con sus líneas en streaming (admin), una fila por línea de venta.
+    Lee con un cursor server-side, así que la memoria no crece con el rango de fechas.
+    """
+    stmt = build_export_query(from_date, to_date, registered_only)
+    filename = f"ventas_{from_date or 'inicio'}_{to_date or 'hoy'}.{format}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    if format == "csv":
+        return StreamingResponse(stream_csv(stmt), media_type="text/csv", headers=headers)
+    return StreamingResponse(stream_ndjson(stmt), media_type="application/x-ndjson", headers=headers)
 
 @router.put("/{sale_id}/pagado", response_model=SaleAdminView)
-def set_pagado(
+async def set_pagado(
     sale_id: int,
-    db: Session = Depends(get_db),
-    admin_user: UserSchema = Depends(require_admin) # Requiere admin
+    db: AsyncSession = Depends(get_async_db),
+    admin_user: Identity = Depends(require_admin) # Requiere admin
 ):
     """Marca una venta como pagada (admin)."""
-    sale = db.query(Sale).filter(Sale.id == sale_id).first()
+    sale = await db.get(Sale, sale_id)
     if not sale:
         raise HTTPException(status_code=404, detail="Venta no encontrada")
     if sale.pagado:
-         return sale # Ya está pagada, idempotente
+         return await load_sale_full(db, sale.id) # Ya está pagada, idempotente
 
-    sale.pagado = True
+    sale_status.mark_paid(sale)
     try:
-        db.commit()
-        db.refresh(sale)
+        await db.commit()
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         print(f"Error setting sale {sale_id} as paid: {e}")
         raise HTTPException(status_code=500, detail="Error interno al marcar como pagado.")
 
+    await after_sale_commit(db, "sale.paid", sale)
+
     # Recargar con relaciones para la respuesta completa
-    sale_for_response = db.query(Sale).options(
-        selectinload(Sale.user),
-        selectinload(Sale.line_of_sales).selectinload(LineOfSale.product)
-    ).filter(Sale.id == sale.id).one_or_none()
+    sale_for_response = await load_sale_full(db, sale.id)
 
     if not sale_for_response:
          raise HTTPException(status_code=500, detail="Error al recuperar la venta marcada como pagada.")
@@ -304,16 +502,18 @@ def set_pagado(
 
 
 @router.post("/ventas/caja", response_model=SaleAdminView)
-def crear_venta_en_caja(
+async def crear_venta_en_caja(
     venta_data: SaleWithLines,
-    db: Session = Depends(get_db),
-    admin_user: UserSchema = Depends(require_admin) # Requiere admin
+    db: AsyncSession = Depends(get_async_db),
+    admin_user: Identity = Depends(require_admin), # Requiere admin
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
 ):
     """
     Crea una venta directa en caja. Descuenta stock. Valida producto activo. (Admin)
+    Con el header Idempotency-Key, un reintento devuelve la venta ya creada.
     """
     usuario_caja_id = 5 # Considera buscarlo dinámicamente
-    db_user_caja = db.query(User).filter(User.id == usuario_caja_id).first()
+    db_user_caja = await db.get(User, usuario_caja_id)
     if not db_user_caja:
          raise HTTPException(
              status_code=status.HTTP_404_NOT_FOUND,
@@ -340,67 +540,82 @@ def crear_venta_en_caja(
         order_confirmed=True,
         sale_in_register=True,
         pagado=True,
+        status=sale_status.FINALIZADO,
         medioPago=venta_data.medioPago,
         user_id=usuario_caja_id
     )
-
-    db.add(nueva_venta)
+    idempotency_scope = f"sales/ventas/caja:{admin_user.id}"
 
     try:
-        db.flush() # Obtener ID de la venta
-
-        for index, linea_data in enumerate(lines_data):
-            # Bloquear producto
-            producto = db.query(Product).filter(Product.id == linea_data.product_id).with_for_update().first()
-
-            if not producto:
-                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Producto con id {linea_data.product_id} no encontrado.")
-
-            # --- VALIDACIÓN SOFT DELETE ---
-            if not producto.is_active:
-                 raise HTTPException(
-                     status_code=status.HTTP_400_BAD_REQUEST,
-                     detail=f"El producto '{producto.nombre}' ya no está disponible para la venta."
-                 )
-            # ----------------------------
-
-            if producto.stock < linea_data.cantidad:
-                raise HTTPException(
-                    status_code=status.HTTP_409_CONFLICT,
-                    detail=f"Stock insuficiente para '{producto.nombre}'. Stock actual: {producto.stock}, Solicitado: {linea_data.cantidad}"
-                )
-
-            # Descontar stock al registrar venta en caja
-            producto.stock -= linea_data.cantidad
-
-            linea_venta = LineOfSale(
+        if idempotency_key:
+            # Espera a un duplicado en vuelo y, si ya se procesó, devuelve la respuesta original
+            fingerprint = idempotency.request_fingerprint(venta_data)
+            await idempotency.acquire(db, idempotency_scope, idempotency_key)
+            replay = await idempotency.lookup(db, idempotency_scope, idempotency_key, fingerprint)
+            if replay is not None:
+                await db.rollback() # Libera el advisory lock
+                return idempotent_replay(replay)
+
+        db.add(nueva_venta)
+        await db.flush() # Obtener ID de la venta
+
+        # Descontar stock con UPDATE condicionales (respetando lo reservado por pedidos online).
+        # Valida existencia, soft delete y stock disponible.
+        precios = await decrement_stock(db, sum_quantities(lines_data))
+
+        lineas_venta = [
+            dict(
                 cantidad=linea_data.cantidad,
                 numeroDeLinea=index + 1,
-                precio=producto.precioActual,
+                precio=precios[linea_data.product_id],
                 sale_id=nueva_venta.id,
                 product_id=linea_data.product_id,
             )
-            db.add(linea_venta)
-
-        db.commit() # Guardar venta, líneas y actualización de stock
-
+            for index, linea_data in enumerate(lines_data)
+        ]
+
+        # Insertar todas las líneas en un único INSERT
+        await db.execute(insert(LineOfSale), lineas_venta)
+        nueva_venta.total = lines_total(lineas_venta)
+        await db.flush() # autoflush está desactivado: escribir el total antes de recargar la venta
+
+        # Sumar la venta al rollup diario en la misma transacción. Depende del FOR UPDATE de
+        # arriba: sin él, un registro duplicado sumaría la venta dos veces
+        await add_sale_to_rollup(db, nueva_venta.date, nueva_venta.medioPago, lineas_venta)
+
+        if idempotency_key:
+            # Guardar la respuesta en la misma transacción que la venta
+            response_body = await serialize_sale(db, nueva_venta.id)
+            await idempotency.store(db, idempotency_scope, idempotency_key, fingerprint, response_body)
+
+        await db.commit() # Guardar venta, líneas y actualización de stock
+
+    except StockNoDisponible as exc:
+        await db.rollback()
+        raise await stock_error(
+            db, exc,
+            inactive_detail="El producto '{nombre}' ya no está disponible para la venta.",
+            insufficient_detail="Stock insuficiente para '{nombre}'. Stock actual: {disponible}, Solicitado: {cantidad}",
+        )
     except HTTPException as http_exc:
-        db.rollback()
+        await db.rollback()
         raise http_exc
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         print(f"Error de base de datos al crear venta en caja: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error interno al procesar la venta.")
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         print(f"Error inesperado al crear venta en caja: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error inesperado al crear la venta.")
 
-    # Cargar relaciones para la respuesta completa
-    sale_for_response = db.query(Sale).options(
-        selectinload(Sale.user),
-        selectinload(Sale.line_of_sales).selectinload(LineOfSale.product) # Carga producto activo o inactivo
-    ).filter(Sale.id == nueva_venta.id).one_or_none()
+    await after_sale_commit(db, "sale.created", nueva_venta)
+
+    if idempotency_key:
+        return response_body
+
+    # Recargar con relaciones para la respuesta completa
+    sale_for_response = await load_sale_full(db, nueva_venta.id)
 
     if not sale_for_response:
          raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error al recuperar la venta de caja creada.")
@@ -409,18 +624,20 @@ def crear_venta_en_caja(
 
 
 @router.put("/{sale_id}/register", response_model=SaleAdminView)
-def register_sale_in_caja_admin(
+async def register_sale_in_caja_admin(
     sale_id: int,
-    db: Session = Depends(get_db),
-    admin_user: UserSchema = Depends(require_admin) # Requiere admin
+    db: AsyncSession = Depends(get_async_db),
+    admin_user: Identity = Depends(require_admin) # Requiere admin
 ):
     """
     Marca una venta online como registrada/retirada. Descuenta stock. Valida producto activo. (Admin)
     """
-    # Cargar la venta y sus líneas/productos eficientemente
-    sale = db.query(Sale).options(
-        selectinload(Sale.line_of_sales).selectinload(LineOfSale.product)
-    ).filter(Sale.id == sale_id).first()
+    # Cargar la venta y sus líneas. FOR UPDATE: un segundo registro en paralelo (doble click,
+    # dos cajas) espera al primero y después ve sale_in_register=True, sin descontar dos veces
+    result = await db.execute(
+        select(Sale).options(selectinload(Sale.line_of_sales)).where(Sale.id == sale_id).with_for_update()
+    )
+    sale = result.scalars().first()
 
     if not sale:
         raise HTTPException(
@@ -435,55 +652,47 @@ def register_sale_in_caja_admin(
          )
 
     if sale.sale_in_register:
-        return sale # Ya está registrada, idempotente
+        return await load_sale_full(db, sale.id) # Ya está registrada, idempotente
 
     try:
-        for line in sale.line_of_sales:
-            # Re-obtener producto con bloqueo para actualizar stock
-            product_to_update = db.query(Product).filter(Product.id == line.product_id).with_for_update().first()
-
-            if not product_to_update:
-                 raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error de integridad: Producto ID {line.product_id} no encontrado para la línea {line.id}.")
-
-            # --- VALIDACIÓN SOFT DELETE (al momento del retiro) ---
-            if not product_to_update.is_active:
-                 raise HTTPException(
-                     status_code=status.HTTP_400_BAD_REQUEST,
-                     detail=f"El producto '{product_to_update.nombre}' fue desactivado y no se puede completar el retiro."
-                 )
-            # ---------------------------------------------------
-
-            # Re-verificar stock al momento del retiro
-            if product_to_update.stock < line.cantidad:
-                raise HTTPException(
-                    status_code=status.HTTP_409_CONFLICT,
-                    detail=f"Stock insuficiente para '{product_to_update.nombre}' al momento del retiro. Stock actual: {product_to_update.stock}, Pedido: {line.cantidad}"
-                )
-            # Descontar stock AHORA
-            product_to_update.stock -= line.cantidad
-
-        # Marcar como registrada
-        sale.sale_in_register = True
-
-        db.commit() # Guardar cambios en stock y estado de la venta
-
+        # Descontar stock AHORA consumiendo la reserva del pedido (un UPDATE condicional para todos los productos).
+        # Valida soft delete al momento del retiro; si la reserva venció se re-verifica el disponible.
+        await consume_reservations(db, sale.id, sum_quantities(sale.line_of_sales))
+
+        # Marcar como registrada (o finalizada si ya estaba pagada)
+        sale_status.mark_registered(sale)
+
+        # Sumar la venta al rollup diario en la misma transacción. Depende del FOR UPDATE de
+        # arriba: sin él, un registro duplicado sumaría la venta dos veces
+        await add_sale_to_rollup(db, sale.date, sale.medioPago, sale.line_of_sales)
+
+        await db.commit() # Guardar cambios en stock, reservas y estado de la venta
+
+    except StockNoDisponible as exc:
+        await db.rollback()
+        raise await stock_error(
+            db, exc,
+            inactive_detail="El producto '{nombre}' fue desactivado y no se puede completar el retiro.",
+            insufficient_detail="Stock insuficiente para '{nombre}' al momento del retiro. Stock actual: {disponible}, Pedido: {cantidad}",
+            not_found_status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            not_found_detail="Error de integridad: Producto ID {product_id} no encontrado para la venta.",
+        )
     except HTTPException as http_exc:
-        db.rollback()
+        await db.rollback()
         raise http_exc
     except SQLAlchemyError as e:
-         db.rollback()
+         await db.rollback()
          print(f"Error de base de datos al registrar venta {sale_id}: {e}")
          raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error interno al registrar el retiro.")
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         print(f"Error inesperado al registrar venta {sale_id}: {e}")
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error inesperado al registrar el retiro.")
 
+    await after_sale_commit(db, "sale.registered", sale)
+
     # Recargar con relaciones para la respuesta completa
-    sale_for_response = db.query(Sale).options(
-        selectinload(Sale.user),
-        selectinload(Sale.line_of_sales).selectinload(LineOfSale.product)
-    ).filter(Sale.id == sale.id).one_or_none()
+    sale_for_response = await load_sale_full(db, sale.id)
 
     if not sale_for_response:
          raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Error al recuperar la venta registrada.")
@@ -493,25 +702,48 @@ def register_sale_in_caja_admin(
 
 # GET - Pedidos del usuario actual listos para retirar
 @router.get("/my-orders/ready-for-pickup", response_model=List[SaleAdminView])
-def get_my_ready_orders(
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user) # Usar Modelo User
+async def get_my_ready_orders(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Identity = Depends(get_current_identity) # Identidad cacheada: sólo se usa el id
 ):
     """
     Obtiene los pedidos del usuario autenticado que están confirmados
     pero aún no han sido marcados como registrados/retirados.
     """
     try:
-        ready_sales = db.query(Sale).options(
-            selectinload(Sale.user), # Carga usuario (aunque sea el mismo)
-            selectinload(Sale.line_of_sales).selectinload(LineOfSale.product) # Carga producto activo o inactivo
-        ).filter(
-            Sale.user_id == current_user.id,
-            Sale.order_confirmed == True,
-            Sale.sale_in_register == False
-        ).order_by(Sale.date.desc(), Sale.id.desc()).all()
+        result = await db.execute(
+            select_sales_full().where(
+                Sale.user_id == current_user.id,
+                Sale.status == sale_status.CONFIRMADO # Índice parcial ix_sales_confirmados_user
+            ).order_by(Sale.date.desc(), Sale.id.desc())
+        )
+        ready_sales = result.scalars().all()
     except Exception as e:
         print(f"Error fetching ready orders for user {current_user.id}: {e}")
         raise HTTPException(status_code=500, detail="Error interno al obtener los pedidos listos para retirar.")
 
-    return ready_sales
\ No newline at end of file
+    return list_response(ready_sales)
+
+# --- Feed de eventos (SSE) ---
+
+@router.get("/events")
+async def sales_events_admin(
+    request: Request,
+    admin_user: Identity = Depends(require_admin) # Requiere admin
+):
+    """
+    Stream SSE con los eventos de todas las ventas (sale.created, sale.confirmed,
+    sale.registered, sale.paid). Reemplaza el polling de las colas de la cocina.
+    """
+    return sse_response(request, SALES_CHANNEL)
+
+
+@router.get("/my-orders/events")
+async def my_orders_events(
+    request: Request,
+    current_user: Identity = Depends(get_current_identity)
+):
+    """Stream SSE con los eventos de los pedidos del usuario autenticado."""
+    # Sin sesión de base: el stream puede quedar abierto horas
+    user_id = current_user.id
+    return sse_response(request, SALES_CHANNEL, lambda event: event["sale"]["user_id"] == user_id)
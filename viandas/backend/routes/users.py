@@ -1,55 +1,62 @@
 # routes/users.py
 from fastapi import APIRouter, HTTPException, Depends
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from models.models import User
 from schemas.schemas import UserCreate, User as UserSchema, UserBase
-from api.deps import get_db, get_current_user
-from core.security import get_password_hash
+from api.deps import get_async_db, get_current_user
+from core.passwords import hash_password
+from core.identity import invalidate_identity
 from pydantic import BaseModel, EmailStr, Field
 
 
 router = APIRouter()
 
 @router.post("/", response_model=UserSchema)
-def create_user(user: UserCreate, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.email == user.email).first()
+async def create_user(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    result = await db.execute(select(User).where(User.email == user.email))
+    db_user = result.scalars().first()
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await hash_password(user.password) # bcrypt en el pool de procesos
     db_user = User(email=user.email, name=user.name, apellido = user.apellido, celular = user.celular, hashed_password=hashed_password)
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     return db_user
 
 @router.get("/me", response_model=UserSchema)
-def get_current_user_info(current_user: User = Depends(get_current_user)):
+async def get_current_user_info(current_user: User = Depends(get_current_user)):
     return current_user
 
 
 
 @router.put("/update-user-email", response_model=UserSchema)
-def update_user_data(email: EmailStr, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    db_user = db.query(User).filter(User.id == current_user.id).first()
+async def update_user_data(email: EmailStr, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
+    db_user = await db.get(User, current_user.id)
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    email_exists = db.query(User).filter(User.email == email, User.id != current_user.id).first()
+    result = await db.execute(select(User).where(User.email == email, User.id != current_user.id))
+    email_exists = result.scalars().first()
     if email_exists:
         raise HTTPException(status_code=400, detail="Email already in use")
     
+    old_email = db_user.email
     db_user.email = email
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    await invalidate_identity(old_email) # Los tokens emitidos con el email viejo dejan de ser válidos
     return db_user
 
 @router.put("/update-user-cellphone", response_model=UserSchema)
-def update_user_cellphone(celular: str, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    db_user = db.query(User).filter(User.id == current_user.id).first()
+async def update_user_cellphone(celular: str, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
+    db_user = await db.get(User, current_user.id)
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
 
     db_user.celular = celular
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    await invalidate_identity(db_user.email)
     return db_user
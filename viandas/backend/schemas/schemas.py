@@ -1,9 +1,9 @@
 # viandas/backend/schemas/schemas.py
 # (COMPLETO Y CORREGIDO para Soft Delete)
 
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, EmailStr, Field, computed_field
 from datetime import date
-from typing import Optional, List
+from typing import Optional, List, Dict
 
 # --------------------
 # User Schemas
@@ -31,6 +31,11 @@ class User(UserBase):
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+    expires_in: Optional[int] = None # Segundos de vida del access_token
+
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str
 
 class TokenData(BaseModel):
     email: Optional[str] = None
@@ -69,6 +74,13 @@ class Product(ProductBase):
     # Esquema para devolver un producto desde la API
     id: int
     is_active: bool # Asegurar que siempre se devuelva el estado
+    reserved: int = 0 # Cantidad reservada por pedidos online pendientes de retiro
+
+    @computed_field
+    @property
+    def available(self) -> int:
+        # Stock que todavía se puede vender o reservar
+        return self.stock - self.reserved
 
     class Config:
         from_attributes = True # Habilitar modo ORM
@@ -82,6 +94,11 @@ class LineOfSaleBase(BaseModel):
 class LineOfSaleCreate(LineOfSaleBase):
     product_id: int
 
+class LineOfSaleAppend(LineOfSaleCreate):
+    # Línea agregada a una venta existente (routes/lines.py)
+    sale_id: int
+    numeroDeLinea: Optional[int] = None # Por defecto, la siguiente de la venta
+
 class LineOfSale(LineOfSaleBase):
     id: int
     numeroDeLinea: Optional[int] = None
@@ -121,14 +138,96 @@ class LineOfSaleFull(BaseModel):
 class SaleAdminView(BaseModel):
     id: int
     quantity_product: int
+    total: float = 0 # Suma de cantidad * precio de las líneas
     observation: Optional[str]
     date: date
     order_confirmed: bool
     sale_in_register: bool
     medioPago: Optional[str]
     pagado: bool
+    status: str # solicitado | confirmado | registrado | finalizado
     user: Optional[User] = None # Puede ser null para ventas de caja
     line_of_sales: List[LineOfSaleFull] # Usa LineOfSaleFull
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+# --- Vista COMPACTA (normalizada) para listados grandes ---
+# Las ventas referencian productos y usuarios por id; cada entidad aparece una sola vez
+# en los diccionarios `products` y `users` de la página.
+
+class LineOfSaleCompact(BaseModel):
+    id: int
+    cantidad: int
+    numeroDeLinea: Optional[int] = None
+    precio: float
+    product_id: int
+
+    class Config:
+        from_attributes = True
+
+class SaleCompact(BaseModel):
+    id: int
+    quantity_product: int
+    total: float = 0
+    observation: Optional[str]
+    date: date
+    order_confirmed: bool
+    sale_in_register: bool
+    medioPago: Optional[str]
+    pagado: bool
+    status: str # solicitado | confirmado | registrado | finalizado
+    user_id: Optional[int] = None
+    line_of_sales: List[LineOfSaleCompact]
+
+    class Config:
+        from_attributes = True
+
+class SalesCompactPage(BaseModel):
+    sales: List[SaleCompact]
+    products: Dict[int, Product]
+    users: Dict[int, User]
+    next_cursor: Optional[str] = None
+
+# --------------------
+# Report Schemas (rollup diario de ventas)
+# --------------------
+class RollupTotals(BaseModel):
+    units: int
+    revenue: float
+
+class PaymentRollup(RollupTotals):
+    medioPago: Optional[str]
+
+class ProductRollup(RollupTotals):
+    product_id: int
+    nombre: str
+    sales_count: int # Ventas que incluyen el producto
+
+class DayRollup(RollupTotals):
+    date: date
+
+class SalesReport(BaseModel):
+    period: str
+    from_date: date
+    to_date: date
+    totals: RollupTotals
+    by_payment: List[PaymentRollup]
+    by_product: List[ProductRollup]
+    by_day: List[DayRollup]
+
+# --------------------
+# Production Plan Schemas (cocina)
+# --------------------
+class ProductionPlanItem(BaseModel):
+    product_id: int
+    nombre: str
+    solicitados: int
+    confirmados: int
+    total: int
+
+class ProductionPlan(BaseModel):
+    date: date
+    items: List[ProductionPlanItem]
+    total: int
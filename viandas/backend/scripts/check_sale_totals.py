@@ -0,0 +1,56 @@
+# scripts/check_sale_totals.py
+# Verifica que Sale.total coincida con la suma de cantidad * precio de sus líneas.
+#
+# Uso (desde viandas/backend, contra la base configurada en DATABASE_URL):
+#   python -m scripts.check_sale_totals            # lista las ventas con diferencias
+#   python -m scripts.check_sale_totals --fix      # y las corrige
+#
+# Sale con código 1 si encontró diferencias (útil en un cron o en CI).
+
+import argparse
+import sys
+
+from sqlalchemy import func, select, update
+
+from config import engine
+from models.models import Sale, LineOfSale
+
+# Los totales son Float: diferencias menores a medio centavo son redondeo
+TOLERANCE = 0.005
+
+
+def drift_query(limit: int):
+    lines_total = (
+        select(LineOfSale.sale_id, func.sum(LineOfSale.cantidad * LineOfSale.precio).label("lines_total"))
+        .group_by(LineOfSale.sale_id)
+        .subquery()
+    )
+    expected = func.coalesce(lines_total.c.lines_total, 0)
+    return (
+        select(Sale.id, Sale.date, Sale.total, expected.label("expected"))
+        .outerjoin(lines_total, lines_total.c.sale_id == Sale.id)
+        .where(func.abs(Sale.total - expected) > TOLERANCE)
+        .order_by(Sale.id)
+        .limit(limit)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verifica Sale.total contra sus líneas")
+    parser.add_argument("--fix", action="store_true", help="corregir los totales con diferencias")
+    parser.add_argument("--limit", type=int, default=1000, help="máximo de ventas a listar/corregir")
+    args = parser.parse_args()
+
+    with engine.begin() as conn:
+        drifted = conn.execute(drift_query(args.limit)).all()
+        for row in drifted:
+            print(f"venta {row.id} ({row.date}): total={row.total} líneas={row.expected} diferencia={row.total - row.expected:+.2f}")
+            if args.fix:
+                conn.execute(update(Sale).where(Sale.id == row.id).values(total=row.expected))
+
+    print(f"\nVentas con diferencias: {len(drifted)}" + (" (corregidas)" if args.fix and drifted else ""))
+    sys.exit(1 if drifted and not args.fix else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# scripts/explain_queries.py
+# Corre EXPLAIN sobre las queries de los endpoints de ventas y muestra qué índice usa cada una.
+#
+# Uso (desde viandas/backend, contra la base configurada en DATABASE_URL):
+#   python -m scripts.explain_queries             # planes reales
+#   python -m scripts.explain_queries --analyze   # EXPLAIN ANALYZE (ejecuta las queries)
+#   python -m scripts.explain_queries --no-seqscan
+#
+# Con tablas chicas Postgres prefiere un Seq Scan aunque el índice exista; --no-seqscan
+# desactiva los seq scans en la sesión para comprobar que el índice es utilizable.
+
+import argparse
+import json
+import sys
+
+from sqlalchemy import select, func, text
+from sqlalchemy.dialects import postgresql
+
+from config import engine
+from core import sale_status
+from core.pagination import DEFAULT_PAGE_LIMIT
+from models.models import Sale, LineOfSale
+
+
+def endpoint_queries(conn):
+    """(nombre, statement) con la query principal de cada endpoint, tal como la arma routes/sales.py."""
+    today = conn.execute(select(func.coalesce(func.max(Sale.date), func.current_date()))).scalar()
+    user_id = conn.execute(select(func.coalesce(func.max(Sale.user_id), 0))).scalar()
+    sale_ids = conn.execute(select(Sale.id).order_by(Sale.id.desc()).limit(DEFAULT_PAGE_LIMIT)).scalars().all() or [0]
+    page = DEFAULT_PAGE_LIMIT + 1
+    return [
+        ("GET /sales/all",
+         select(Sale).order_by(Sale.id.desc()).limit(page)),
+        ("GET /sales/pedidos-solicitados",
+         select(Sale).where(Sale.status == sale_status.SOLICITADO)
+         .order_by(Sale.date.asc(), Sale.id.asc()).limit(page)),
+        ("GET /sales/pendientes-retiro",
+         select(Sale).where(Sale.status == sale_status.CONFIRMADO)
+         .order_by(Sale.date.asc(), Sale.id.asc()).limit(page)),
+        ("GET /sales/ventas?sale_date=",
+         select(Sale).where(Sale.sale_in_register == True, Sale.date == today)
+         .order_by(Sale.date.desc(), Sale.id.desc()).limit(page)),
+        ("GET /sales/ventas?from=&to=",
+         select(Sale).where(Sale.sale_in_register == True, Sale.date >= today.replace(day=1), Sale.date <= today)
+         .order_by(Sale.date.desc(), Sale.id.desc()).limit(page)),
+        ("GET /sales/my-orders/ready-for-pickup",
+         select(Sale).where(Sale.user_id == user_id, Sale.status == sale_status.CONFIRMADO)
+         .order_by(Sale.date.desc(), Sale.id.desc())),
+        ("selectinload(Sale.line_of_sales)",
+         select(LineOfSale).where(LineOfSale.sale_id.in_(sale_ids))),
+    ]
+
+
+def scan_nodes(plan: dict):
+    """Recorre el plan y devuelve (tipo de nodo, relación, índice) de cada scan."""
+    nodes = []
+    if "Scan" in plan.get("Node Type", ""):
+        nodes.append((plan["Node Type"], plan.get("Relation Name"), plan.get("Index Name")))
+    for child in plan.get("Plans", []):
+        nodes.extend(scan_nodes(child))
+    return nodes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--analyze", action="store_true", help="usar EXPLAIN ANALYZE")
+    parser.add_argument("--no-seqscan", action="store_true", help="SET enable_seqscan = off")
+    parser.add_argument("--verbose", action="store_true", help="imprimir el plan completo")
+    args = parser.parse_args()
+
+    options = "FORMAT JSON" + (", ANALYZE, BUFFERS" if args.analyze else "")
+    seq_scans = 0
+    with engine.connect() as conn:
+        if args.no_seqscan:
+            conn.execute(text("SET enable_seqscan = off"))
+        for name, stmt in endpoint_queries(conn):
+            sql = str(stmt.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+            raw = conn.execute(text(f"EXPLAIN ({options}) {sql}")).scalar()
+            plan = (raw if isinstance(raw, list) else json.loads(raw))[0]["Plan"]
+            print(f"\n== {name}")
+            for node_type, relation, index in scan_nodes(plan):
+                marker = "  <-- SEQ SCAN" if node_type == "Seq Scan" else ""
+                seq_scans += node_type == "Seq Scan"
+                print(f"   {node_type:22} {relation or '':12} {index or ''}{marker}")
+            print(f"   costo estimado: {plan['Total Cost']}" + (f", tiempo real: {plan['Actual Total Time']} ms" if args.analyze else ""))
+            if args.verbose:
+                print(json.dumps(plan, indent=2))
+        conn.rollback()
+
+    print(f"\nSeq scans: {seq_scans}")
+    sys.exit(1 if seq_scans and args.no_seqscan else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+# scripts/rebuild_sales_rollup.py
+# Recalcula daily_sales_rollup desde sales + lineOfSale (carga inicial o corrección).
+#
+# Uso (desde viandas/backend, contra la base configurada en DATABASE_URL):
+#   python -m scripts.rebuild_sales_rollup                          # todo el histórico
+#   python -m scripts.rebuild_sales_rollup --from 2026-01-01 --to 2026-01-31
+#
+# DELETE + INSERT ... SELECT del rango en una sola transacción. Toma un lock sobre la
+# tabla para que ninguna venta sume al rollup mientras se recalcula el rango.
+
+import argparse
+from datetime import date
+
+from sqlalchemy import text
+
+from config import engine
+from core.rollups import rebuild_statements
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recalcula el rollup diario de ventas")
+    parser.add_argument("--from", dest="from_date", type=date.fromisoformat, help="fecha mínima (YYYY-MM-DD)")
+    parser.add_argument("--to", dest="to_date", type=date.fromisoformat, help="fecha máxima (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    delete_stmt, insert_stmt = rebuild_statements(args.from_date, args.to_date)
+    with engine.begin() as conn:
+        # Las ventas que registran esperan al commit en lugar de sumar sobre filas borradas
+        conn.execute(text("LOCK TABLE daily_sales_rollup IN SHARE ROW EXCLUSIVE MODE"))
+        deleted = conn.execute(delete_stmt).rowcount
+        inserted = conn.execute(insert_stmt).rowcount
+    print(f"Rollup recalculado: {deleted} filas borradas, {inserted} filas insertadas")
+
+
+if __name__ == "__main__":
+    main()